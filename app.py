@@ -1,23 +1,54 @@
 """Streamlit conversational bot application for RAG system."""
 import streamlit as st
+import asyncio
 import os
+import shutil
 from pathlib import Path
 import sys
-import re
+import time
 import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+from functools import partial
+from itertools import chain
+import hashlib
+import multiprocessing
 import json
 
 # Add the project root to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 import config
-from src.document_processor import DocumentProcessor
-from src.embeddings import EmbeddingGenerator
-from src.database import WeaviateDatabase
-from src.search import SearchEngine
-from src.conversational_rag_engine import ConversationalRAGEngine
 from src.conversation_manager import ConversationManager
+# PDF parsing, OpenAI and Weaviate modules are imported where they are first
+# needed, so the first page renders without loading them
+
+
+# Collection used for indexing and search
+COLLECTION_NAME = config.COLLECTION_NAME
+
+# Threads running searches concurrently with the rest of a chat turn, shared by all sessions
+SEARCH_WORKERS = 4
+
+# Maximum number of worker processes parsing uploaded PDFs, leaving one core to the UI
+MAX_UPLOAD_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+# Buffer size used when streaming uploaded PDFs to disk
+UPLOAD_COPY_BUFFER_SIZE = 8 * 1024 * 1024
+
+# Maximum number of queries kept in the search cache
+SEARCH_CACHE_SIZE = 20
+
+# Number of recent messages kept preformatted for the prompt history
+HISTORY_WINDOW = 10
+
+# Warning shown above an answer that reports contradictory sources
+CONTRADICTION_WARNING = "⚠️ **Informations contradictoires détectées** - Veuillez vérifier les sources citées ci-dessous."
+
+# Characters kept from the previous streamed chunk so a keyword split across chunks is still found
+CONTRADICTION_SCAN_OVERLAP = 16
 
 
 # Page configuration
@@ -29,128 +60,48 @@ st.set_page_config(
 
 
 # Custom CSS for chat interface with better contrast
-st.markdown("""
-<style>
-    /* Chat message styling with better contrast */
-    .stChatMessage {
-        border-radius: 10px;
-        padding: 10px;
-        margin: 5px 0;
-    }
-    
-    /* Light mode specific styles */
-    @media (prefers-color-scheme: light) {
-        .stChatMessage[data-testid="user-message"] {
-            background-color: #e3f2fd !important;
-            color: #0d47a1 !important;
-        }
-        
-        .stChatMessage[data-testid="assistant-message"] {
-            background-color: #f5f5f5 !important;
-            color: #212121 !important;
-        }
-        
-        .source-box {
-            background-color: #e8eaf6 !important;
-            color: #1a237e !important;
-            padding: 10px;
-            border-radius: 5px;
-            margin: 5px 0;
-            font-size: 0.9em;
-            border: 1px solid #c5cae9;
-        }
-        
-        /* Ensure text in the main area is readable */
-        .main .block-container {
-            color: #212121 !important;
-        }
-        
-        /* Fix sidebar text */
-        .css-1d391kg, [data-testid="stSidebar"] {
-            color: #212121 !important;
-        }
-        
-        /* Fix input text */
-        .stTextInput input {
-            color: #212121 !important;
-        }
-    }
-    
-    /* Dark mode specific styles */
-    @media (prefers-color-scheme: dark) {
-        .stChatMessage[data-testid="user-message"] {
-            background-color: #1e3a5f !important;
-            color: #e3f2fd !important;
-        }
-        
-        .stChatMessage[data-testid="assistant-message"] {
-            background-color: #2e2e2e !important;
-            color: #e0e0e0 !important;
-        }
-        
-        .source-box {
-            background-color: #3f51b5 !important;
-            color: #e8eaf6 !important;
-            padding: 10px;
-            border-radius: 5px;
-            margin: 5px 0;
-            font-size: 0.9em;
-            border: 1px solid #5c6bc0;
-        }
-    }
-    
-    /* General improvements for both modes */
-    .stMarkdown {
-        color: inherit !important;
-    }
-    
-    /* Better button visibility */
-    .stButton > button {
-        border: 1px solid currentColor;
-    }
-    
-    /* Improve metric visibility */
-    [data-testid="metric-container"] {
-        background-color: rgba(128, 128, 128, 0.1);
-        padding: 10px;
-        border-radius: 5px;
-    }
-    
-    /* Fix expander text */
-    .streamlit-expanderHeader {
-        color: inherit !important;
-    }
-    
-    /* Ensure code blocks are readable */
-    .stCodeBlock {
-        background-color: rgba(128, 128, 128, 0.1) !important;
-    }
-</style>
-""", unsafe_allow_html=True)
-
-# Initialize session state
-if 'initialized' not in st.session_state:
-    st.session_state.initialized = False
-if 'db' not in st.session_state:
-    st.session_state.db = None
-if 'embedding_gen' not in st.session_state:
-    st.session_state.embedding_gen = None
-if 'search_engine' not in st.session_state:
-    st.session_state.search_engine = None
-if 'rag_engine' not in st.session_state:
-    st.session_state.rag_engine = None
-if 'conversation_manager' not in st.session_state:
-    st.session_state.conversation_manager = None
-if 'messages' not in st.session_state:
-    st.session_state.messages = []
-if 'search_cache' not in st.session_state:
-    st.session_state.search_cache = {}
-if 'current_context' not in st.session_state:
-    st.session_state.current_context = []
-if 'conversation_id' not in st.session_state:
-    st.session_state.conversation_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+CHAT_CSS_PATH = Path(__file__).parent / "assets" / "chat.css"
 
 
+@st.cache_data(show_spinner=False)
+def load_css() -> str:
+    """Read the chat stylesheet once per process."""
+    return f"<style>\n{CHAT_CSS_PATH.read_text(encoding='utf-8')}</style>"
+
+
+def inject_css():
+    """Inject the chat CSS into the page.
+
+    Streamlit drops elements that are not re-emitted during a rerun, so this
+    has to run on every rerun to keep the styles applied.
+    """
+    st.markdown(load_css(), unsafe_allow_html=True)
+
+
+inject_css()
+
+# Initialize session state; callables are only invoked for missing keys
+SESSION_DEFAULTS = {
+    'initialized': False,
+    'db': None,
+    'embedding_gen': None,
+    'search_engine': None,
+    'rag_engine': None,
+    'conversation_manager': None,
+    'messages': list,
+    'encoded_messages': list,
+    'formatted_history': lambda: deque(maxlen=HISTORY_WINDOW),
+    'search_cache': OrderedDict,
+    'current_context': list,
+    'collection_ready': False,
+    'conversation_id': lambda: datetime.now().strftime("%Y%m%d_%H%M%S"),
+}
+for key, default in SESSION_DEFAULTS.items():
+    if key not in st.session_state:
+        st.session_state[key] = default() if callable(default) else default
+
+
+@st.cache_data(show_spinner=False)
 def check_configuration():
     """Check if all required configuration is present."""
     missing_configs = []
@@ -165,8 +116,50 @@ def check_configuration():
     return missing_configs
 
 
+@st.cache_resource(show_spinner=False)
+def create_vector_database():
+    """Connect to Weaviate once per process and share the client across sessions and reruns."""
+    from src.database import WeaviateDatabase
+    
+    return WeaviateDatabase()
+
+
+@st.cache_data(ttl=10, show_spinner=False)
+def get_collection_stats(collection_name: str) -> dict:
+    """Collection statistics, cached briefly so reruns do not query Weaviate each time.
+
+    Cleared whenever the collection is reset or documents are ingested.
+    """
+    return create_vector_database().get_collection_stats(collection_name)
+
+
+@st.cache_resource(show_spinner=False)
+def get_search_executor():
+    """Thread pool running document searches off the script thread.
+
+    Workers only call the search engine, never st.* APIs.
+    """
+    return ThreadPoolExecutor(max_workers=SEARCH_WORKERS)
+
+
+@st.cache_resource(show_spinner=False)
+def get_parsing_pool():
+    """Start the PDF parsing worker processes once and share them across uploads.
+
+    Spawned workers keep their parsing libraries imported between uploads.
+    """
+    return ProcessPoolExecutor(
+        max_workers=MAX_UPLOAD_WORKERS,
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+
 def initialize_system():
     """Initialize all system components."""
+    from src.embeddings import EmbeddingGenerator
+    from src.search import SearchEngine
+    from src.conversational_rag_engine import ConversationalRAGEngine
+    
     progress_bar = st.progress(0)
     status_text = st.empty()
     
@@ -180,57 +173,63 @@ def initialize_system():
             return False
         progress_bar.progress(20)
         
-        # Initialize database
-        status_text.text("Connecting to Weaviate...")
-        try:
-            st.session_state.db = WeaviateDatabase()
-            st.success("✓ Connected to Weaviate")
-        except Exception as e:
-            st.error(f"Failed to connect to Weaviate: {str(e)}")
-            return False
-        progress_bar.progress(40)
-        
-        # Initialize embedding generator
-        status_text.text("Initializing embedding generator...")
-        try:
-            st.session_state.embedding_gen = EmbeddingGenerator()
-            st.success("✓ Embedding generator initialized")
-        except Exception as e:
-            st.error(f"Failed to initialize embeddings: {str(e)}")
-            return False
-        progress_bar.progress(60)
-        
-        # Initialize search engine
-        status_text.text("Initializing search engine...")
-        st.session_state.search_engine = SearchEngine(
-            st.session_state.db.client,
-            st.session_state.embedding_gen
-        )
-        st.success("✓ Search engine initialized")
-        progress_bar.progress(70)
-        
-        # Initialize conversational RAG engine
-        status_text.text("Initializing conversational RAG engine...")
-        st.session_state.rag_engine = ConversationalRAGEngine()
-        st.success("✓ Conversational RAG engine initialized")
-        progress_bar.progress(85)
-        
-        # Initialize conversation manager
-        status_text.text("Initializing conversation manager...")
-        st.session_state.conversation_manager = ConversationManager()
-        st.success("✓ Conversation manager initialized")
-        progress_bar.progress(100)
+        # The OpenAI clients and the conversation manager do not depend on Weaviate,
+        # so they are built in worker threads while the connection is established
+        with ThreadPoolExecutor(max_workers=3) as init_pool:
+            embedding_future = init_pool.submit(EmbeddingGenerator)
+            rag_engine_future = init_pool.submit(ConversationalRAGEngine)
+            conversation_manager_future = init_pool.submit(ConversationManager)
+            
+            # Initialize database
+            status_text.text("Connecting to Weaviate...")
+            try:
+                st.session_state.db = create_vector_database()
+                st.success("✓ Connected to Weaviate")
+            except Exception as e:
+                st.error(f"Failed to connect to Weaviate: {str(e)}")
+                return False
+            progress_bar.progress(40)
+            
+            # Initialize embedding generator
+            status_text.text("Initializing embedding generator...")
+            try:
+                st.session_state.embedding_gen = embedding_future.result()
+                st.success("✓ Embedding generator initialized")
+            except Exception as e:
+                st.error(f"Failed to initialize embeddings: {str(e)}")
+                return False
+            progress_bar.progress(60)
+            
+            # Initialize search engine
+            status_text.text("Initializing search engine...")
+            st.session_state.search_engine = SearchEngine(
+                st.session_state.db.client,
+                st.session_state.embedding_gen
+            )
+            st.success("✓ Search engine initialized")
+            progress_bar.progress(70)
+            
+            # Initialize conversational RAG engine
+            status_text.text("Initializing conversational RAG engine...")
+            st.session_state.rag_engine = rag_engine_future.result()
+            st.success("✓ Conversational RAG engine initialized")
+            progress_bar.progress(85)
+            
+            # Initialize conversation manager
+            status_text.text("Initializing conversation manager...")
+            st.session_state.conversation_manager = conversation_manager_future.result()
+            st.success("✓ Conversation manager initialized")
+            progress_bar.progress(100)
         
         status_text.text("System initialized successfully!")
         st.session_state.initialized = True
         
         # Add welcome message
         if not st.session_state.messages:
-            st.session_state.messages.append({
-                "role": "assistant",
-                "content": "Bonjour! Je suis votre assistant conversationnel spécialisé dans les documents BTP. Comment puis-je vous aider aujourd'hui?",
-                "timestamp": datetime.now().isoformat()
-            })
+            add_message(new_message(
+                "assistant",
+                "Bonjour! Je suis votre assistant conversationnel spécialisé dans les documents BTP. Comment puis-je vous aider aujourd'hui?"
+            ))
         
         return True
         
@@ -243,111 +242,80 @@ def initialize_system():
         status_text.empty()
 
 
-def should_search_documents(query: str, recent_context: list) -> bool:
-    """Determine if we need to search documents for this query."""
-    
-    query_lower = query.lower().strip()
-    
-    # Handle very short queries
-    if len(query_lower) < 3:
-        return False
-    
-    # Direct document references
-    document_patterns = [
-        r'\b(document|fichier|page|pdf|dossier)\b',
-        r'\b(section|chapitre|partie|paragraphe)\b'
-    ]
-    
-    # Question patterns
-    question_patterns = [
-        r'^(quel|quelle|quels|quelles)\b',
-        r'^(où|ou)\b.*\?',
-        r'^(comment|combien|pourquoi|quand|qui|quoi)\b',
-        r'\b(trouve|recherche|cherche|localise)\b',
-        r'\b(montre|affiche|présente|donne)\b.*\b(moi|nous)\b'
-    ]
-    
-    # No-search patterns
-    no_search_patterns = [
-        r'^(merci|ok|d\'accord|compris|parfait)',
-        r'^(bonjour|salut|bonsoir|hello|hi)\b',
-        r'\b(explique|précise|reformule|clarifie)\b',
-        r'^(oui|non|si|peut-être)\b',
-        r'^\?+$',  # Just question marks
-    ]
-    
-    # Check no-search patterns first
-    for pattern in no_search_patterns:
-        if re.search(pattern, query_lower):
-            return False
-    
-    # Check search patterns
-    for pattern in document_patterns + question_patterns:
-        if re.search(pattern, query_lower):
-            return True
-    
-    # Context-aware decision
-    if recent_context:
-        # If it's a very short follow-up, likely doesn't need search
-        if len(query_lower.split()) <= 3:
-            # Check if it's a pronoun reference
-            pronoun_patterns = [r'^(il|elle|ce|ça|cela|celui)', r'\b(le|la|les)\b']
-            if any(re.search(p, query_lower) for p in pronoun_patterns):
-                return False
+def _cache_key(query: str, limit: int) -> tuple:
+    """Return the search cache key: a 64-bit fingerprint of the normalized query and the limit."""
+    digest = hashlib.blake2b(query.strip().casefold().encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big"), limit
+
+
+def get_cached_search_results(query: str, limit: int):
+    """Get cached search results if available and not expired."""
+    search_cache = st.session_state.search_cache
+    cache_key = _cache_key(query, limit)
+    cached_data = search_cache.get(cache_key)
+    if cached_data is None:
+        return None
     
-    # Check if it's a complete question (ends with ?)
-    if query.strip().endswith('?') and len(query_lower.split()) > 3:
-        return True
+    expiry, results = cached_data
+    if expiry <= time.monotonic():
+        del search_cache[cache_key]
+        return None
     
-    # Default: search for queries > 5 words, don't search for shorter ones
-    return len(query_lower.split()) > 4
-
-
-def get_cached_search_results(query: str, cache_duration_minutes: int = 5):
-    """Get cached search results if available and recent."""
-    cache_key = query.lower().strip()
-    if cache_key in st.session_state.search_cache:
-        cached_data = st.session_state.search_cache[cache_key]
-        cached_time = datetime.fromisoformat(cached_data['timestamp'])
-        if (datetime.now() - cached_time).seconds < cache_duration_minutes * 60:
-            return cached_data['results']
-    return None
-
-
-def cache_search_results(query: str, results: list):
-    """Cache search results with timestamp."""
-    cache_key = query.lower().strip()
-    st.session_state.search_cache[cache_key] = {
-        'results': results,
-        'timestamp': datetime.now().isoformat()
-    }
+    # Mark as most recently used
+    search_cache.move_to_end(cache_key)
+    return results
+
+
+def cache_search_results(query: str, limit: int, results: list, cache_duration_minutes: int = 5):
+    """Cache search results with an expiry time, evicting the least recently used entries."""
+    search_cache = st.session_state.search_cache
+    cache_key = _cache_key(query, limit)
+    search_cache[cache_key] = (time.monotonic() + cache_duration_minutes * 60, results)
+    search_cache.move_to_end(cache_key)
     
     # Limit cache size
-    if len(st.session_state.search_cache) > 20:
-        # Remove oldest entries
-        sorted_cache = sorted(st.session_state.search_cache.items(), 
-                            key=lambda x: x[1]['timestamp'])
-        st.session_state.search_cache = dict(sorted_cache[-20:])
+    while len(search_cache) > SEARCH_CACHE_SIZE:
+        search_cache.popitem(last=False)
+
+
+def collection_ready() -> bool:
+    """Check whether the collection exists, only asking Weaviate until it does."""
+    if not st.session_state.collection_ready and st.session_state.db:
+        st.session_state.collection_ready = st.session_state.db.collection_exists(COLLECTION_NAME)
+    return st.session_state.collection_ready
+
+
+def ensure_collection():
+    """Create the collection unless it is already known to exist."""
+    if not collection_ready():
+        st.session_state.db.create_collection(COLLECTION_NAME)
+        st.session_state.collection_ready = True
+
 
 def reset_vector_database():
     """Reset the vector database by deleting and recreating the collection."""
+    from src.conversational_rag_engine import clear_response_cache
+    
     try:
         # Check if collection exists and has data
-        if st.session_state.db and st.session_state.db.collection_exists(config.COLLECTION_NAME):
+        if st.session_state.db and st.session_state.db.collection_exists(COLLECTION_NAME):
             # Get collection stats to check if it's empty
-            stats = st.session_state.db.get_collection_stats(config.COLLECTION_NAME)
+            stats = st.session_state.db.get_collection_stats(COLLECTION_NAME)
             
             if stats["object_count"] == 0:
                 return False, "La base de données est déjà vide. Aucune réinitialisation nécessaire."
             
             # Delete the collection
-            st.session_state.db.client.collections.delete(config.COLLECTION_NAME)
+            st.session_state.db.client.collections.delete(COLLECTION_NAME)
             
             # Recreate the collection
-            st.session_state.db.create_collection(config.COLLECTION_NAME)
+            st.session_state.db.create_collection(COLLECTION_NAME)
             
             # Clear all related states
-            st.session_state.search_cache = {}
+            get_collection_stats.clear()
+            clear_response_cache()
+            st.session_state.collection_ready = False
+            st.session_state.search_cache = OrderedDict()
             st.session_state.current_context = []
             
             # Clear conversation but keep system initialized
@@ -356,7 +324,8 @@ def reset_vector_database():
             return True, "Base de données vectorielle réinitialisée avec succès!"
         else:
             # Collection doesn't exist, create it
-            st.session_state.db.create_collection(config.COLLECTION_NAME)
+            st.session_state.db.create_collection(COLLECTION_NAME)
+            get_collection_stats.clear()
             return False, "La collection n'existait pas. Une nouvelle collection a été créée."
     except Exception as e:
         return False, f"Erreur lors de la réinitialisation: {str(e)}"
@@ -370,34 +339,103 @@ def display_message(message):
         
         st.markdown(message["content"])
         
-        # Display timestamp
-        if "timestamp" in message:
+        # Display timestamp, formatted once when the message was created
+        if "time_hhmm" in message:
+            st.caption(f"🕐 {message['time_hhmm']}")
+        elif "timestamp" in message:
             st.caption(f"🕐 {datetime.fromisoformat(message['timestamp']).strftime('%H:%M')}")
 
 
-def export_conversation():
-    """Export the current conversation."""
-    conversation_data = {
-        "conversation_id": st.session_state.conversation_id,
-        "messages": st.session_state.messages,
-        "export_date": datetime.now().isoformat()
-    }
+def export_conversation() -> bytes:
+    """Export the current conversation as UTF-8 encoded JSON.
     
-    return json.dumps(conversation_data, ensure_ascii=False, indent=2)
+    Messages are serialized once by add_message; the export only joins them.
+    """
+    encoded_messages = st.session_state.encoded_messages
+    if len(encoded_messages) != len(st.session_state.messages):
+        encoded_messages = [json.dumps(message, ensure_ascii=False) for message in st.session_state.messages]
+    
+    # Same layout as json.dumps on the whole conversation dict
+    return (
+        f'{{"conversation_id": {json.dumps(st.session_state.conversation_id, ensure_ascii=False)}, '
+        f'"messages": [{", ".join(encoded_messages)}], '
+        f'"export_date": {json.dumps(datetime.now().isoformat())}}}'
+    ).encode("utf-8")
+
+
+def new_message(role, content, **fields):
+    """Build a chat message, reading the clock once for both timestamp fields."""
+    now = datetime.now()
+    return {
+        "role": role,
+        "content": content,
+        "timestamp": now.isoformat(),
+        "time_hhmm": now.strftime('%H:%M'),
+        **fields
+    }
+
+
+def add_message(message):
+    """Append a message to the conversation, its export encoding and the preformatted history window."""
+    st.session_state.messages.append(message)
+    st.session_state.encoded_messages.append(json.dumps(message, ensure_ascii=False))
+    if message['role'] != 'system':
+        st.session_state.formatted_history.append(ConversationManager.format_message(message))
 
 
 def clear_conversation():
     """Clear the current conversation."""
-    st.session_state.messages = [{
-        "role": "assistant",
-        "content": "Conversation réinitialisée. Comment puis-je vous aider?",
-        "timestamp": datetime.now().isoformat()
-    }]
-    st.session_state.search_cache = {}
+    st.session_state.messages = []
+    st.session_state.encoded_messages = []
+    st.session_state.formatted_history = deque(maxlen=HISTORY_WINDOW)
+    add_message(new_message("assistant", "Conversation réinitialisée. Comment puis-je vous aider?"))
+    st.session_state.search_cache = OrderedDict()
     st.session_state.current_context = []
     st.session_state.conversation_id = datetime.now().strftime("%Y%m%d_%H%M%S")
 
 
+def stream_with_contradiction_check(chunks, mentions_contradiction, warning_placeholder):
+    """Pass streamed chunks through, showing the contradiction warning as soon as a keyword appears."""
+    tail = ""
+    for chunk in chunks:
+        if tail is not None:
+            window = tail + chunk
+            if mentions_contradiction(window):
+                warning_placeholder.warning(CONTRADICTION_WARNING)
+                tail = None  # Warning shown, stop scanning
+            else:
+                tail = window[-CONTRADICTION_SCAN_OVERLAP:]
+        yield chunk
+
+
+def select_suggestion():
+    """Store the follow-up suggestion picked in the suggestion pills."""
+    st.session_state.prompt_input = st.session_state.suggestion_pills
+
+
+def _update_embedding_progress(progress_bars, file_ranges, done, total):
+    """Move each file's progress bar through the embedding phase (40-80%)."""
+    for idx, (start, count) in file_ranges.items():
+        if count:
+            fraction = min(max(done - start, 0), count) / count
+            progress_bars[idx].progress(40 + int(40 * fraction))
+
+
+def _update_ingestion_progress(progress_bars, done, total):
+    """Move the progress bars of the indexed files through the indexing phase (80-100%)."""
+    for progress_bar in progress_bars:
+        progress_bar.progress(80 + int(20 * done / total))
+
+
+def _save_uploaded_file(uploaded_file) -> str:
+    """Persist an uploaded PDF to the documents folder and return its path."""
+    save_path = os.path.join(config.DOCUMENTS_PATH, uploaded_file.name)
+    uploaded_file.seek(0)
+    with open(save_path, "wb") as f:
+        shutil.copyfileobj(uploaded_file, f, UPLOAD_COPY_BUFFER_SIZE)
+    return save_path
+
+
 def main():
     st.title("💬 Assistant Conversationnel RAG - Documents BTP")
     
@@ -424,7 +462,7 @@ def main():
             # Collection stats
             if st.session_state.db:
                 try:
-                    stats = st.session_state.db.get_collection_stats(config.COLLECTION_NAME)
+                    stats = get_collection_stats(COLLECTION_NAME)
                     if stats["exists"]:
                         st.metric("Documents indexés", stats['object_count'])
                 except Exception:
@@ -459,8 +497,8 @@ def main():
         # Get current database status
         db_status = "Non initialisée"
         object_count = 0
-        if st.session_state.db and st.session_state.db.collection_exists(config.COLLECTION_NAME):
-            stats = st.session_state.db.get_collection_stats(config.COLLECTION_NAME)
+        if collection_ready():
+            stats = get_collection_stats(COLLECTION_NAME)
             object_count = stats.get("object_count", 0)
             db_status = f"{object_count} documents indexés"
         
@@ -502,76 +540,138 @@ def main():
         # Document upload section
         if st.session_state.initialized:
             st.header("📄 Télécharger des documents")
-            uploaded_file = st.file_uploader("Choisir un fichier PDF", type="pdf")
-            
-            if uploaded_file is not None:
-                if st.button("📤 Traiter le document"):
+            uploaded_files = st.file_uploader(
+                "Choisir des fichiers PDF", type="pdf", accept_multiple_files=True
+            )
+
+            if uploaded_files:
+                # Summarize the selection in a single element
+                total_size_mb = sum(f.size for f in uploaded_files) / (1024 * 1024)
+                st.text("\n".join(
+                    f"• {f.name} ({f.size / (1024 * 1024):.1f} MB)" for f in uploaded_files
+                ) + f"\n📊 Taille totale: {total_size_mb:.1f} MB")
+                
+                if st.button("📤 Traiter les documents"):
                     os.makedirs(config.DOCUMENTS_PATH, exist_ok=True)
                     os.makedirs(config.IMAGES_PATH, exist_ok=True)
-                    
-                    save_path = os.path.join(config.DOCUMENTS_PATH, uploaded_file.name)
-                    
-                    with open(save_path, "wb") as f:
-                        f.write(uploaded_file.getbuffer())
-                    
 
+                    # Create one progress bar and status line per file
+                    file_progress_bars = []
+                    file_status_texts = []
+                    for uploaded_file in uploaded_files:
+                        file_status_texts.append(st.empty())
+                        file_progress_bars.append(st.progress(0))
+                        file_status_texts[-1].text(f"⏳ {uploaded_file.name}: en attente...")
+
+                    processed_files = []
+                    failed_files = []
+                    # Summary totals, accumulated while files are recorded
+                    total_pages = 0
+                    total_segments = 0
+                    extracted_by_file = {}
 
-                    # Create progress bar and status containers
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
-                    
                     try:
-                        # Step 1: Initialize processor
-                        status_text.text("📄 Initialisation du processeur de documents...")
-                        progress_bar.progress(10)
-                        processor = DocumentProcessor(images_output_dir=config.IMAGES_PATH)
-                        
-                        # Step 2: Process PDF
-                        status_text.text("📖 Extraction du contenu du PDF...")
-                        progress_bar.progress(25)
-                        raw_data = processor.process_pdf(save_path)
+                        # Phase A: save every file, then parse them in the shared worker
+                        # processes. Workers only receive file paths; Streamlit objects
+                        # are only touched from this thread.
+                        from src.document_processor import extract_pdf
+                        from src.conversational_rag_engine import clear_response_cache
                         
-                        # Step 3: Extract text with metadata
-                        status_text.text("📝 Extraction du texte et des métadonnées...")
-                        progress_bar.progress(40)
-                        extracted_data = processor.extract_text_with_metadata(raw_data, save_path)
-                        
-                        # Step 4: Check/Create collection
-                        status_text.text("🗄️ Vérification de la collection...")
-                        progress_bar.progress(50)
-                        if not st.session_state.db.collection_exists(config.COLLECTION_NAME):
-                            st.session_state.db.create_collection(config.COLLECTION_NAME)
-                        
-                        # Step 5: Ingest data with progress
-                        status_text.text(f"💾 Indexation de {len(extracted_data)} segments...")
-                        progress_bar.progress(60)
-                        
-                        # For detailed progress during ingestion, we need to modify the ingest_text_data method
-                        # For now, we'll show the ingestion as a single step
-                        success = st.session_state.db.ingest_text_data(
-                            config.COLLECTION_NAME,
-                            extracted_data,
-                            st.session_state.embedding_gen
+                        save_paths = [_save_uploaded_file(f) for f in uploaded_files]
+                        executor = get_parsing_pool()
+                        futures = {
+                            executor.submit(extract_pdf, save_path, config.IMAGES_PATH): idx
+                            for idx, save_path in enumerate(save_paths)
+                        }
+
+                        for future in as_completed(futures):
+                            idx = futures[future]
+                            name = uploaded_files[idx].name
+                            try:
+                                extracted_by_file[idx] = future.result()
+                            except Exception as e:
+                                if isinstance(e, BrokenProcessPool):
+                                    # A crashed worker breaks the pool; start a fresh one next time
+                                    get_parsing_pool.clear()
+                                failed_files.append({"name": name, "error": str(e)})
+                                file_progress_bars[idx].progress(100)
+                                file_status_texts[idx].text(f"❌ {name}: {str(e)}")
+                                continue
+
+                            file_progress_bars[idx].progress(40)
+                            file_status_texts[idx].text(
+                                f"🧮 {name}: {len(extracted_by_file[idx])} segments à vectoriser..."
+                            )
+
+                        # Phase B: embed the segments of all files in pooled batch requests
+                        texts = []
+                        file_ranges = {}
+                        for idx, extracted_data in sorted(extracted_by_file.items()):
+                            file_ranges[idx] = (len(texts), len(extracted_data))
+                            texts.extend(item['text'] for item in extracted_data)
+
+                        vectors = st.session_state.embedding_gen.get_embeddings(
+                            texts,
+                            progress_callback=partial(_update_embedding_progress, file_progress_bars, file_ranges)
                         )
-                        
-                        if success:
-                            progress_bar.progress(100)
-                            status_text.text("✅ Traitement terminé!")
-                            st.success(f"✓ {len(extracted_data)} segments traités avec succès!")
-                            # st.balloons()
-                        else:
-                            status_text.text("❌ Échec de l'indexation")
-                            st.error("Erreur lors de l'indexation des données")
-                            
+
+                        # Phase C: index the segments of all files with concurrent async batch uploads
+                        if extracted_by_file:
+                            ensure_collection()
+
+                            for idx, (start, count) in file_ranges.items():
+                                file_status_texts[idx].text(
+                                    f"💾 {uploaded_files[idx].name}: indexation de {count} segments..."
+                                )
+
+                            success = asyncio.run(st.session_state.db.ingest_embedded_data_async(
+                                COLLECTION_NAME,
+                                list(chain.from_iterable(
+                                    extracted_data for _, extracted_data in sorted(extracted_by_file.items())
+                                )),
+                                vectors,
+                                progress_callback=partial(
+                                    _update_ingestion_progress,
+                                    [file_progress_bars[idx] for idx in file_ranges]
+                                )
+                            ))
+                            # The collection changed, refresh the cached stats and answers
+                            get_collection_stats.clear()
+                            clear_response_cache()
+
+                            for idx, (start, count) in file_ranges.items():
+                                name = uploaded_files[idx].name
+                                file_progress_bars[idx].progress(100)
+                                if success:
+                                    pages = len({item['page_number'] for item in extracted_by_file[idx]})
+                                    processed_files.append({
+                                        "name": name,
+                                        "pages": pages,
+                                        "segments": count
+                                    })
+                                    total_pages += pages
+                                    total_segments += count
+                                    file_status_texts[idx].text(f"✅ {name}: {count} segments")
+                                else:
+                                    failed_files.append({"name": name, "error": "Erreur lors de l'indexation des données"})
+                                    file_status_texts[idx].text(f"❌ {name}: échec de l'indexation")
+
+                        if processed_files:
+                            st.success(
+                                f"✓ {len(processed_files)} document(s) traité(s): "
+                                f"{total_pages} pages, {total_segments} segments indexés"
+                            )
+                        for failed in failed_files:
+                            st.error(f"Erreur ({failed['name']}): {failed['error']}")
+
                     except Exception as e:
-                        status_text.text("❌ Erreur lors du traitement")
                         st.error(f"Erreur: {str(e)}")
                     finally:
                         # Clean up progress indicators after a short delay
-                        import time
                         time.sleep(1)
-                        progress_bar.empty()
-                        status_text.empty()
+                        for progress_bar, status_text in zip(file_progress_bars, file_status_texts):
+                            progress_bar.empty()
+                            status_text.empty()
         
         # Conversation settings
         st.markdown("---")
@@ -593,137 +693,209 @@ def main():
         
         # Chat input
         if prompt := st.chat_input("Posez votre question sur les documents BTP..."):
+            # Bind session objects used throughout the turn
+            search_engine = st.session_state.search_engine
+            rag_engine = st.session_state.rag_engine
+            current_context = st.session_state.current_context
+            
             # Add user message
-            user_message = {
-                "role": "user",
-                "content": prompt,
-                "timestamp": datetime.now().isoformat()
-            }
-            st.session_state.messages.append(user_message)
+            user_message = new_message("user", prompt)
+            add_message(user_message)
             display_message(user_message)
             
             # Process the query
             with st.chat_message("assistant"):
                 thinking_placeholder = st.empty()
+                # One status element whose label is updated at each step
+                if show_thinking:
+                    thinking_status = thinking_placeholder.status("🤔 Traitement...", expanded=False)
                 
                 try:
+                    from src.search import should_search_documents
+                    
                     # Check if we need to search
-                    need_search = should_search_documents(prompt, st.session_state.current_context)
+                    messages = st.session_state.messages
+                    last_answer = messages[-2]["content"] if len(messages) > 1 else ""
+                    
+                    # Ambiguous questions wait on a classifier call: start the search meanwhile,
+                    # so it is ready if the answer is yes and simply dropped otherwise
+                    speculative_searches = []
+                    
+                    def classify_while_searching(query_lower):
+                        if auto_search and not get_cached_search_results(prompt, search_limit):
+                            speculative_searches.append(get_search_executor().submit(
+                                search_engine.search_multimodal,
+                                prompt,
+                                COLLECTION_NAME,
+                                limit=search_limit
+                            ))
+                        return rag_engine.needs_document_search(query_lower, last_answer=last_answer)
+                    
+                    need_search = should_search_documents(
+                        prompt,
+                        current_context,
+                        classifier=classify_while_searching
+                    )
                     
                     if show_thinking:
-                        thinking_placeholder.info(
-                            f"🤔 Analyse de la question... {'Recherche nécessaire' if need_search else 'Utilisation du contexte existant'}"
+                        thinking_status.update(
+                            label=f"🤔 Analyse de la question... {'Recherche nécessaire' if need_search else 'Utilisation du contexte existant'}"
                         )
                     
                     search_results = []
                     formatted_results = []
+                    search_future = None
                     
                     if need_search and auto_search:
                         # Check cache first
-                        cached_results = get_cached_search_results(prompt)
+                        cached_results = get_cached_search_results(prompt, search_limit)
                         
                         if cached_results:
                             if show_thinking:
-                                thinking_placeholder.info("📋 Utilisation des résultats en cache...")
+                                thinking_status.update(label="📋 Utilisation des résultats en cache...")
                             search_results = cached_results
                             print("\n" + "="*80)
                             print("📋 USING CACHED RESULTS")
                             print("="*80)
                         else:
                             if show_thinking:
-                                thinking_placeholder.info("🔍 Recherche dans les documents...")
-                            
-                            # Perform search
-                            search_results = st.session_state.search_engine.search_multimodal(
-                                prompt, 
-                                config.COLLECTION_NAME, 
-                                limit=search_limit
-                            )
+                                thinking_status.update(label="🔍 Recherche dans les documents...")
                             
-                            # Cache results
-                            if search_results:
-                                cache_search_results(prompt, search_results)
+                            # Perform search in a worker thread while the history is assembled,
+                            # unless it already started during classification
+                            if speculative_searches:
+                                search_future = speculative_searches[0]
+                            else:
+                                search_future = get_search_executor().submit(
+                                    search_engine.search_multimodal,
+                                    prompt, 
+                                    COLLECTION_NAME, 
+                                    limit=search_limit
+                                )
+                    
+                    # Get conversation history from the preformatted window
+                    conversation_history = ConversationManager.join_formatted_history(
+                        st.session_state.formatted_history
+                    )
+                    
+                    if search_future is not None:
+                        search_results = search_future.result()
+                        
+                        # Cache results
+                        if search_results:
+                            cache_search_results(prompt, search_limit, search_results)
+                    
+                    # DEBUG: Print raw search results
+                    # print("\n" + "="*80)
+                    # print(f"🔍 SEARCH QUERY: {prompt}")
+                    # print(f"📊 NUMBER OF RESULTS: {len(search_results) if search_results else 0}")
+                    # print("="*80)
+                    
+                    # if search_results:
+                    #     for i, result in enumerate(search_results):
+                    #         print(f"\n--- RESULT {i+1} ---")
+                    #         print(f"📄 Document: {result.properties.get('source_document', 'N/A')}")
+                    #         print(f"📍 Page: {result.properties.get('page_number', 'N/A')}")
+                    #         print(f"📍 Paragraph: {result.properties.get('paragraph_number', 'N/A')}")
+                    #         print(f"📏 Distance: {result.metadata.distance if hasattr(result.metadata, 'distance') else 'N/A'}")
+                    #         print(f"📝 Text Preview (first 300 chars):")
+                    #         text = result.properties.get('text', '')
+                    #         print(f"   {text[:300]}..." if len(text) > 300 else f"   {text}")
+                    #         print("-" * 40)
+                    # else:
+                    #     print("❌ No results found!")
+                    
+                    # print("="*80 + "\n")
+                    
+                    if search_results:
+                        formatted_results = search_engine.format_search_results(
+                            search_results
+                        )
                         
-                        # DEBUG: Print raw search results
+                        # DEBUG: Print formatted results
                         # print("\n" + "="*80)
-                        # print(f"🔍 SEARCH QUERY: {prompt}")
-                        # print(f"📊 NUMBER OF RESULTS: {len(search_results) if search_results else 0}")
+                        # print("📋 FORMATTED RESULTS FOR LLM")
                         # print("="*80)
-                        
-                        # if search_results:
-                        #     for i, result in enumerate(search_results):
-                        #         print(f"\n--- RESULT {i+1} ---")
-                        #         print(f"📄 Document: {result.properties.get('source_document', 'N/A')}")
-                        #         print(f"📍 Page: {result.properties.get('page_number', 'N/A')}")
-                        #         print(f"📍 Paragraph: {result.properties.get('paragraph_number', 'N/A')}")
-                        #         print(f"📏 Distance: {result.metadata.distance if hasattr(result.metadata, 'distance') else 'N/A'}")
-                        #         print(f"📝 Text Preview (first 300 chars):")
-                        #         text = result.properties.get('text', '')
-                        #         print(f"   {text[:300]}..." if len(text) > 300 else f"   {text}")
-                        #         print("-" * 40)
-                        # else:
-                        #     print("❌ No results found!")
-                        
+                        # for i, formatted in enumerate(formatted_results):
+                        #     print(f"\n--- FORMATTED RESULT {i+1} ---")
+                        #     print(f"Source: {formatted['source_document']}")
+                        #     print(f"Page: {formatted['page_number']}, Paragraph: {formatted['paragraph_number']}")
+                        #     print(f"Distance: {formatted['distance']:.4f}")
+                        #     print(f"Text: {formatted['text_preview']}")
                         # print("="*80 + "\n")
                         
-                        if search_results:
-                            formatted_results = st.session_state.search_engine.format_search_results(
-                                search_results
-                            )
-                            
-                            # DEBUG: Print formatted results
-                            # print("\n" + "="*80)
-                            # print("📋 FORMATTED RESULTS FOR LLM")
-                            # print("="*80)
-                            # for i, formatted in enumerate(formatted_results):
-                            #     print(f"\n--- FORMATTED RESULT {i+1} ---")
-                            #     print(f"Source: {formatted['source_document']}")
-                            #     print(f"Page: {formatted['page_number']}, Paragraph: {formatted['paragraph_number']}")
-                            #     print(f"Distance: {formatted['distance']:.4f}")
-                            #     print(f"Text: {formatted['text_preview']}")
-                            # print("="*80 + "\n")
-                            
-                            # Update current context
-                            st.session_state.current_context = formatted_results
-                    
-                    # Get conversation history
-                    conversation_history = st.session_state.conversation_manager.get_formatted_history(
-                        st.session_state.messages[-10:]  # Last 10 messages
-                    )
+                        # Update current context
+                        st.session_state.current_context = formatted_results
                     
                     if show_thinking:
-                        thinking_placeholder.info("💭 Génération de la réponse...")
+                        thinking_status.update(label="💭 Génération de la réponse...")
                     
-                    # Generate response
-                    response_data = st.session_state.rag_engine.generate_conversational_response(
-                        query=prompt,
-                        search_results=formatted_results if need_search else st.session_state.current_context,
-                        conversation_history=conversation_history,
-                        include_sources=need_search
-                    )
+                    response_context = formatted_results if need_search else current_context
                     
                     # Clear thinking placeholder
                     thinking_placeholder.empty()
                     
+                    # Reserve the contradiction warning slot above the response
+                    warning_placeholder = st.empty()
+                    
+                    # The same question over the same retrieved passages and history reuses the stored answer
+                    response_data = rag_engine.get_cached_response(
+                        prompt, response_context, conversation_history, include_sources=need_search
+                    )
+                    
+                    if response_data is not None:
+                        st.markdown(response_data["response"])
+                    else:
+                        # Request follow-up suggestions from the retrieved passages while the answer
+                        # streams; the result is discarded if the answer reports contradictions
+                        suggestions_future = None
+                        if response_context and rag_engine.use_llm_followups:
+                            suggestions_future = get_search_executor().submit(
+                                rag_engine.suggest_follow_ups_from_context,
+                                prompt,
+                                response_context
+                            )
+                        
+                        # Generate and display the response as it streams in
+                        ai_response = st.write_stream(
+                            stream_with_contradiction_check(
+                                rag_engine.generate_conversational_response_stream(
+                                    query=prompt,
+                                    search_results=response_context,
+                                    conversation_history=conversation_history
+                                ),
+                                rag_engine.mentions_contradiction,
+                                warning_placeholder
+                            )
+                        ) or ""  # write_stream returns an empty list when nothing was streamed
+                        
+                        response_data = rag_engine.finalize_response(
+                            query=prompt,
+                            ai_response=ai_response,
+                            search_results=response_context,
+                            include_sources=need_search,
+                            suggestions_future=suggestions_future
+                        )
+                        if ai_response:
+                            rag_engine.cache_response(
+                                prompt, response_context, conversation_history, need_search, response_data
+                            )
+                    
                     # Check for contradictions and display warning if found
                     if response_data.get("has_contradictions", False):
-                        st.warning("⚠️ **Informations contradictoires détectées** - Veuillez vérifier les sources citées ci-dessous.")
-                    
-                    # Display response
-                    st.markdown(response_data["response"])
+                        warning_placeholder.warning(CONTRADICTION_WARNING)
                     
                     # Add assistant message to history
-                    assistant_message = {
-                        "role": "assistant",
-                        "content": response_data["response"],
-                        "timestamp": datetime.now().isoformat(),
-                        "has_contradictions": response_data.get("has_contradictions", False)
-                    }
+                    assistant_message = new_message(
+                        "assistant",
+                        response_data["response"],
+                        has_contradictions=response_data.get("has_contradictions", False)
+                    )
                     
                     if need_search and response_data.get("sources"):
                         assistant_message["sources"] = response_data["sources"]
                     
-                    st.session_state.messages.append(assistant_message)
+                    add_message(assistant_message)
                     
                     # # Display sources if available
                     # if need_search and response_data.get("sources"):
@@ -732,20 +904,20 @@ def main():
                     #             st.markdown(f"""
                     #             <div class="source-box">
                     #             <b>Source {i+1}</b> - Distance: {source['distance']:.3f}<br>
-                    #             📄 Document: {os.path.basename(source['document'])}<br>
+                    #             📄 Document: {source['document_basename']}<br>
                     #             📍 Page {source['page']} | Paragraphe {source['paragraph']}
                     #             </div>
                     #             """, unsafe_allow_html=True)
                     
                     # Suggest follow-up questions
                     if response_data.get("follow_up_suggestions"):
-                        st.markdown("**💡 Questions suggérées:**")
-                        cols = st.columns(len(response_data["follow_up_suggestions"]))
-                        for i, suggestion in enumerate(response_data["follow_up_suggestions"]):
-                            with cols[i]:
-                                if st.button(suggestion, key=f"suggestion_{i}"):
-                                    st.session_state.prompt_input = suggestion
-                                    st.rerun()
+                        # A single pills widget instead of one column and button per suggestion
+                        st.pills(
+                            "**💡 Questions suggérées:**",
+                            response_data["follow_up_suggestions"],
+                            key="suggestion_pills",
+                            on_change=select_suggestion
+                        )
                     
                 except Exception as e:
                     thinking_placeholder.empty()
@@ -1,37 +1,64 @@
 """Configuration file for the RAG system."""
 import os
+from dataclasses import dataclass, fields
+from functools import lru_cache
 from dotenv import load_dotenv
 import streamlit as st
+from streamlit.errors import StreamlitSecretNotFoundError
 
 
 # Load environment variables
 load_dotenv()
 
 
-# Weaviate Configuration
-# Use Streamlit secrets in production
-try:
-    if "WEAVIATE_URL" in st.secrets:
-        WEAVIATE_URL = st.secrets["WEAVIATE_URL"]
-        WEAVIATE_API_KEY = st.secrets["WEAVIATE_API_KEY"]
-        OPENAI_API_KEY = st.secrets["OPENAI_API_KEY"]
-    else:
-        WEAVIATE_URL = os.getenv("WEAVIATE_URL", "")
-        WEAVIATE_API_KEY = os.getenv("WEAVIATE_API_KEY", "")
-        OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
-except:
-    WEAVIATE_URL = os.getenv("WEAVIATE_URL", "")
-    WEAVIATE_API_KEY = os.getenv("WEAVIATE_API_KEY", "")
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+@dataclass(frozen=True)
+class Config:
+    """Credentials, read once per process."""
+    WEAVIATE_URL: str
+    WEAVIATE_API_KEY: str
+    OPENAI_API_KEY: str
+
+
+_CONFIG_FIELDS = frozenset(field.name for field in fields(Config))
+
+
+@lru_cache(maxsize=1)
+def get_config() -> Config:
+    """Load credentials from Streamlit secrets in production, else from the environment."""
+    # Read the secrets file once; each credential then costs a plain dict lookup
+    try:
+        secrets = dict(st.secrets)
+    except (FileNotFoundError, StreamlitSecretNotFoundError):
+        secrets = {}
+    
+    return Config(**{
+        name: secrets.get(name) or os.getenv(name, "")
+        for name in _CONFIG_FIELDS
+    })
+
+
+def __getattr__(name):
+    """Resolve credential attributes (config.WEAVIATE_URL, ...) from the cached Config."""
+    if name in _CONFIG_FIELDS:
+        return getattr(get_config(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # Collection Configuration
 COLLECTION_NAME = "ragbtpdocuments2"
+# Vector index for new collections: "flat" (brute force over 1-bit vectors) suits a
+# document-sized corpus, "hnsw" (graph over int8 vectors) scales to millions of objects
+VECTOR_INDEX_TYPE = "flat"
+# Stored vector compression: "sq" (int8), "bq" (1-bit) or "none"; None uses the index default
+VECTOR_QUANTIZATION = None
 
 # Model Configuration
 EMBEDDING_MODEL = "text-embedding-3-large"
 # CHAT_MODEL = "gpt-4.1-mini"
 # CHAT_MODEL = "gpt-4o-mini"
 CHAT_MODEL = "gpt-4o"
+# Cheap model deciding whether ambiguous questions need a document search
+CLASSIFIER_MODEL = "gpt-4o-mini"
 
 
 # Path Configuration
@@ -42,8 +69,15 @@ IMAGES_PATH = "data/images"
 POPPLER_PATH = os.getenv("POPPLER_PATH", r"C:\Release-24.08.0-0\poppler-24.08.0\Library\bin")
 TESSERACT_PATH = os.getenv("TESSERACT_PATH", r"C:\Program Files\Tesseract-OCR")
 
+
+def _add_to_path(*directories):
+    """Append directories to PATH, comparing whole entries and rewriting it at most once."""
+    path = os.environ.get("PATH", "")
+    known_entries = set(path.split(os.pathsep))
+    new_entries = [d for d in dict.fromkeys(directories) if d and d not in known_entries]
+    if new_entries:
+        os.environ["PATH"] = os.pathsep.join(filter(None, [path, *new_entries]))
+
+
 # Add to PATH if not already there
-if POPPLER_PATH and POPPLER_PATH not in os.environ["PATH"]:
-    os.environ["PATH"] += os.pathsep + POPPLER_PATH
-if TESSERACT_PATH and TESSERACT_PATH not in os.environ["PATH"]:
-    os.environ["PATH"] += os.pathsep + TESSERACT_PATH
\ No newline at end of file
+_add_to_path(POPPLER_PATH, TESSERACT_PATH)
\ No newline at end of file
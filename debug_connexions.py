@@ -1,10 +1,10 @@
 """Debug script to test connections and configurations."""
 import os
-from dotenv import load_dotenv
 import sys
+from dataclasses import asdict
 
-# Load environment variables
-load_dotenv()
+# Credentials come from the same cached loader as the app (secrets, then .env)
+import config
 
 print("=" * 50)
 print("RAG System Debug Tool")
@@ -12,11 +12,7 @@ print("=" * 50)
 
 # Check environment variables
 print("\n1. Checking environment variables...")
-env_vars = {
-    "WEAVIATE_URL": os.getenv("WEAVIATE_URL"),
-    "WEAVIATE_API_KEY": os.getenv("WEAVIATE_API_KEY"),
-    "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY"),
-}
+env_vars = asdict(config.get_config())
 
 missing = []
 for var, value in env_vars.items():
@@ -67,7 +63,7 @@ try:
     # Test with a simple embedding
     response = openai_client.embeddings.create(
         input="test",
-        model="text-embedding-3-large"
+        model=config.EMBEDDING_MODEL
     )
     print("✓ Successfully connected to OpenAI")
     print(f"✓ Embedding dimension: {len(response.data[0].embedding)}")
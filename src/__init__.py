@@ -1,12 +1,19 @@
-"""Initialize the src package with all modules."""
+"""Initialize the src package with all modules.
 
-from .document_processor import DocumentProcessor
-from .embeddings import EmbeddingGenerator
-from .database import WeaviateDatabase
-from .search import SearchEngine
-from .rag_engine import RAGEngine
-from .conversational_rag_engine import ConversationalRAGEngine
-from .conversation_manager import ConversationManager
+Submodules are imported on first attribute access, so importing one module
+(or the package) does not load PDF parsing, OpenAI and Weaviate dependencies.
+"""
+import importlib
+
+_LAZY_ATTRIBUTES = {
+    'DocumentProcessor': '.document_processor',
+    'EmbeddingGenerator': '.embeddings',
+    'WeaviateDatabase': '.database',
+    'SearchEngine': '.search',
+    'RAGEngine': '.rag_engine',
+    'ConversationalRAGEngine': '.conversational_rag_engine',
+    'ConversationManager': '.conversation_manager'
+}
 
 __all__ = [
     'DocumentProcessor',
@@ -18,4 +25,20 @@ __all__ = [
     'ConversationManager'
 ]
 
-__version__ = '2.0.0'  # Updated for conversational support
\ No newline at end of file
+__version__ = '2.0.0'  # Updated for conversational support
+
+
+def __getattr__(name):
+    """Import the submodule defining a public class on first access."""
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value  # Later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    """List the lazily imported classes alongside the module globals."""
+    return sorted(set(globals()) | set(__all__))
@@ -1,50 +1,89 @@
 """Conversation management module for handling chat history and context."""
 import json
 import os
-from typing import List, Dict, Optional
+import re
+import tempfile
+import threading
+from typing import Iterable, List, Sequence, Dict, Optional
 from datetime import datetime, timedelta
 from collections import deque
 
 
+# Terms marking a user question as a key point: question words, technical terms, units
+KEY_POINT_RE = re.compile("|".join(re.escape(term) for term in [
+    'quel', 'comment', 'où', 'quand', 'combien', 'pourquoi',
+    'ascenseur', 'bâtiment', 'étage', 'niveau', 'construction',
+    'structure', 'dimension', 'matériau', 'norme', 'sécurité',
+    'm²', 'mètres', 'cm', 'mm', '%', '€'
+]), re.IGNORECASE)
+
+# Conversation topics, keyed by the terms that reveal them
+TOPIC_LABELS = {
+    'ascenseur': 'ascenseurs',
+    'bâtiment': 'bâtiments',
+    'sécurité': 'sécurité',
+    'norme': 'normes et réglementations',
+    'réglementation': 'normes et réglementations'
+}
+TOPIC_RE = re.compile("|".join(re.escape(term) for term in TOPIC_LABELS), re.IGNORECASE)
+
+# Sidecar file summarizing every saved conversation, so listing them reads one file
+INDEX_FILENAME = "_index.json"
+# Serializes index read-modify-write across sessions, which each own a ConversationManager
+_INDEX_LOCK = threading.Lock()
+
+
 class ConversationManager:
     def __init__(self, max_history_length: int = 20, conversation_dir: str = "data/conversations"):
         self.max_history_length = max_history_length
         self.conversation_dir = conversation_dir
         os.makedirs(conversation_dir, exist_ok=True)
     
-    def get_formatted_history(self, messages: List[Dict], max_chars: int = 2000) -> str:
-        """Format conversation history for inclusion in prompts."""
-        if not messages:
-            return ""
+    @staticmethod
+    def format_message(message: Dict) -> str:
+        """Format a single message for inclusion in prompts."""
+        timestamp = message.get('time_hhmm') or datetime.fromisoformat(message['timestamp']).strftime('%H:%M')
+        role = "Utilisateur" if message['role'] == 'user' else "Assistant"
+        content = message['content']
+        
+        # Truncate long messages
+        if len(content) > 300:
+            content = content[:297] + "..."
         
-        formatted_messages = []
+        return f"[{timestamp}] {role}: {content}"
+    
+    @staticmethod
+    def _join_most_recent(newest_first: Iterable[str], max_chars: int) -> str:
+        """Join formatted messages given most recent first, stopping at the first one that does not fit."""
+        kept_messages = deque()
         total_chars = 0
         
-        # Process messages in reverse order (most recent first)
-        for message in reversed(messages):
-            if message['role'] == 'system':
-                continue
-                
-            # Format message
-            timestamp = datetime.fromisoformat(message['timestamp']).strftime('%H:%M')
-            role = "Utilisateur" if message['role'] == 'user' else "Assistant"
-            content = message['content']
-            
-            # Truncate long messages
-            if len(content) > 300:
-                content = content[:297] + "..."
-            
-            formatted_msg = f"[{timestamp}] {role}: {content}"
-            
+        for formatted_msg in newest_first:
             # Check if adding this message would exceed limit
             if total_chars + len(formatted_msg) > max_chars:
                 break
             
-            formatted_messages.append(formatted_msg)
+            # Prepend so the result stays in chronological order
+            kept_messages.appendleft(formatted_msg)
             total_chars += len(formatted_msg)
         
-        # Return in chronological order
-        return "\n".join(reversed(formatted_messages))
+        return "\n".join(kept_messages)
+    
+    @staticmethod
+    def join_formatted_history(formatted_messages: Sequence[str], max_chars: int = 2000) -> str:
+        """Join preformatted messages, keeping the most recent ones that fit in max_chars."""
+        return ConversationManager._join_most_recent(reversed(formatted_messages), max_chars)
+    
+    def get_formatted_history(self, messages: List[Dict], max_chars: int = 2000) -> str:
+        """Format conversation history for inclusion in prompts."""
+        if not messages:
+            return ""
+        
+        # Messages are formatted lazily, newest first, so older ones past the budget are never formatted
+        return self._join_most_recent(
+            (self.format_message(message) for message in reversed(messages) if message['role'] != 'system'),
+            max_chars
+        )
     
     def save_conversation(self, conversation_id: str, messages: List[Dict]) -> str:
         """Save conversation to disk."""
@@ -59,8 +98,18 @@ class ConversationManager:
             "messages": messages
         }
         
+        # json.dumps without indent uses the C encoder; json.dump never does
         with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(conversation_data, f, ensure_ascii=False, indent=2)
+            f.write(json.dumps(conversation_data, ensure_ascii=False))
+        
+        # Keep the index in step with the saved file
+        with _INDEX_LOCK:
+            index = self._load_index()
+            if index is None:
+                self._rebuild_index()
+            else:
+                index[conversation_id] = self._index_entry(conversation_data)
+                self._write_index(index)
         
         return filepath
     
@@ -73,33 +122,79 @@ class ConversationManager:
             return None
         
         with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
+            conversation_data = json.load(f)
+        
+        # Precompute display times once, so formatting never parses the ISO timestamps
+        for message in conversation_data.get('messages', []):
+            if 'time_hhmm' not in message and 'timestamp' in message:
+                message['time_hhmm'] = datetime.fromisoformat(message['timestamp']).strftime('%H:%M')
+        
+        return conversation_data
+    
+    @staticmethod
+    def _index_entry(data: Dict) -> Dict:
+        """Summary of a saved conversation, as stored in the index."""
+        return {
+            'conversation_id': data['conversation_id'],
+            'created_at': data.get('created_at'),
+            'last_updated': data.get('last_updated'),
+            'message_count': data.get('message_count', 0),
+            'preview': data['messages'][0]['content'][:100] if data.get('messages') else ''
+        }
+    
+    def _load_index(self) -> Optional[Dict[str, Dict]]:
+        """Read the conversation index, or None if it is missing or unreadable."""
+        try:
+            with open(os.path.join(self.conversation_dir, INDEX_FILENAME), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _write_index(self, index: Dict[str, Dict]):
+        """Write the conversation index atomically; callers hold _INDEX_LOCK."""
+        # A unique temp file per write, so an interrupted write never clobbers another one
+        fd, tmp_path = tempfile.mkstemp(dir=self.conversation_dir, prefix="_index.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(index, ensure_ascii=False))
+            os.replace(tmp_path, os.path.join(self.conversation_dir, INDEX_FILENAME))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    
+    def _rebuild_index(self) -> Dict[str, Dict]:
+        """Rebuild the conversation index by reading every saved conversation."""
+        index = {}
+        
+        with os.scandir(self.conversation_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith('.json') and entry.name != INDEX_FILENAME and entry.is_file():
+                    try:
+                        with open(entry.path, 'r', encoding='utf-8') as f:
+                            data = json.load(f)
+                        
+                        index[data['conversation_id']] = self._index_entry(data)
+                    except:
+                        continue
+        
+        self._write_index(index)
+        return index
     
     def list_conversations(self, days: int = 7) -> List[Dict]:
-        """List recent conversations."""
+        """List recent conversations from the index."""
         conversations = []
-        cutoff_date = datetime.now() - timedelta(days=days)
-        
-        for filename in os.listdir(self.conversation_dir):
-            if filename.endswith('.json'):
-                filepath = os.path.join(self.conversation_dir, filename)
-                
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    last_updated = datetime.fromisoformat(data.get('last_updated', ''))
-                    
-                    if last_updated > cutoff_date:
-                        conversations.append({
-                            'conversation_id': data['conversation_id'],
-                            'created_at': data.get('created_at'),
-                            'last_updated': data.get('last_updated'),
-                            'message_count': data.get('message_count', 0),
-                            'preview': data['messages'][0]['content'][:100] if data.get('messages') else ''
-                        })
-                except:
-                    continue
+        # ISO 8601 timestamps sort chronologically as strings, so only the cutoff is formatted
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+        
+        with _INDEX_LOCK:
+            index = self._load_index()
+            if index is None:
+                index = self._rebuild_index()
+        
+        for entry in index.values():
+            last_updated = entry.get('last_updated')
+            if isinstance(last_updated, str) and last_updated > cutoff:
+                conversations.append(dict(entry))
         
         # Sort by last updated, most recent first
         conversations.sort(key=lambda x: x['last_updated'], reverse=True)
@@ -109,26 +204,10 @@ class ConversationManager:
         """Extract key points from conversation for context."""
         key_points = []
         
-        # Look for messages with specific patterns
-        patterns = {
-            'questions': ['quel', 'comment', 'où', 'quand', 'combien', 'pourquoi'],
-            'technical_terms': ['ascenseur', 'bâtiment', 'étage', 'niveau', 'construction', 
-                              'structure', 'dimension', 'matériau', 'norme', 'sécurité'],
-            'numbers': ['m²', 'mètres', 'cm', 'mm', '%', '€']
-        }
-        
         for message in messages:
             if message['role'] == 'user':
-                content_lower = message['content'].lower()
-                
                 # Check for important patterns
-                is_important = False
-                for category, terms in patterns.items():
-                    if any(term in content_lower for term in terms):
-                        is_important = True
-                        break
-                
-                if is_important:
+                if KEY_POINT_RE.search(message['content']):
                     key_points.append(f"Question: {message['content'][:150]}")
             
             elif message['role'] == 'assistant' and 'sources' in message:
@@ -153,19 +232,16 @@ class ConversationManager:
         
         for message in messages:
             if 'sources' in message:
-                for source in message['sources']:
-                    mentioned_documents.add(os.path.basename(source['document']))
+                # Sources carry their file name since retrieval; older saved ones may not
+                mentioned_documents.update(
+                    source.get('document_basename') or os.path.basename(source['document'])
+                    for source in message['sources']
+                )
             
             # Extract potential topics (simplified)
-            content_lower = message['content'].lower()
-            if 'ascenseur' in content_lower:
-                topics.add('ascenseurs')
-            if 'bâtiment' in content_lower:
-                topics.add('bâtiments')
-            if 'sécurité' in content_lower:
-                topics.add('sécurité')
-            if 'norme' in content_lower or 'réglementation' in content_lower:
-                topics.add('normes et réglementations')
+            topics.update(
+                TOPIC_LABELS[match.group(0).lower()] for match in TOPIC_RE.finditer(message['content'])
+            )
         
         return {
             "summary": self.get_formatted_history(messages[-10:], max_chars=500),
@@ -193,9 +269,10 @@ class ConversationManager:
         system_messages = [msg for msg in messages if msg['role'] == 'system']
         recent_messages = messages[-self.max_history_length:]
         
-        # Combine, ensuring no duplicates
+        # Combine, ensuring no duplicates: every recent system message is already kept,
+        # so a role check replaces the linear membership test against system_messages
         managed_messages = system_messages + [
-            msg for msg in recent_messages if msg not in system_messages
+            msg for msg in recent_messages if msg['role'] != 'system'
         ]
         
         return managed_messages
\ No newline at end of file
@@ -1,64 +1,182 @@
 """Conversational RAG engine for generating context-aware responses."""
-from openai import OpenAI
-from typing import List, Dict, Optional
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, Future
+from openai import OpenAIError
+from .openai_client import get_openai_client
+from functools import lru_cache
+from typing import Iterator, List, Dict, Optional, Tuple
 import config
 
 
+# Finished answers kept per (question, retrieved passages, conversation history, model). The
+# cache lives at module level, so a session only gets another session's answer when their
+# histories match too (in practice, the same opening question)
+RESPONSE_CACHE_SIZE = 256
+RESPONSE_CACHE_TTL_SECONDS = 3600
+# Response cache: key -> (expiry, response data), least recently used first
+_RESPONSE_CACHE = OrderedDict()
+_RESPONSE_CACHE_LOCK = threading.Lock()
+
+
+def clear_response_cache():
+    """Drop every cached response, e.g. after the document collection changed."""
+    with _RESPONSE_CACHE_LOCK:
+        _RESPONSE_CACHE.clear()
+
+
+# "[HH:MM] " prefix of each formatted history line, left out of the response cache key
+HISTORY_TIMESTAMP_RE = re.compile(r"^\[\d{2}:\d{2}\] ", re.MULTILINE)
+
+# Keywords flagging an answer that reports contradictory sources
+CONTRADICTION_RE = re.compile(r"contradict(?:ion|oire)|incohérent|différent", re.IGNORECASE)
+
+# Structured output schema for analyze_intent: the reply always has exactly these fields
+INTENT_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "intent",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "intent": {
+                    "type": "string",
+                    "enum": ["search", "clarification", "follow_up", "greeting", "thanks"]
+                },
+                "requires_new_search": {"type": "boolean"},
+                "confidence": {"type": "number"}
+            },
+            "required": ["intent", "requires_new_search", "confidence"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# Answer length caps by intent: short social messages need far fewer tokens than document answers
+MAX_TOKENS_BY_INTENT = {
+    'thanks': 40,
+    'greeting': 60,
+    'search': 1000
+}
+# Social intents, only recognized when they make up the whole message ("ok, et l'ascenseur"
+# is a follow-up question and keeps the full budget)
+SOCIAL_INTENT_RE = {
+    'thanks': re.compile(r"(merci( beaucoup| bien)?|ok( merci)?|d'accord|compris|parfait)[\s!.,]*"),
+    'greeting': re.compile(r"(bonjour|salut|bonsoir|hello|hi)[\s!.,]*")
+}
+
+# Follow-up questions offered when an answer mentions a BTP topic, keyed by the revealing term
+FOLLOW_UP_BY_TERM = {
+    'ascenseur': "Quelles sont les caractéristiques des ascenseurs prévus?",
+    'sécurité': "Quelles mesures de sécurité sont exigées?",
+    'norme': "Quelles normes s'appliquent à ce point?",
+    'délai': "Quels sont les délais d'exécution prévus?",
+    'pénalité': "Quelles pénalités sont prévues en cas de retard?",
+    '€': "Ce montant est-il exprimé HT ou TTC?",
+    'matériau': "Quels matériaux sont spécifiés?",
+    'matériaux': "Quels matériaux sont spécifiés?",
+    'étage': "Combien de niveaux comporte le bâtiment?",
+    'surface': "Quelles sont les surfaces de chaque niveau?"
+}
+# Words match whole (an optional plural "s" allowed), so "norme" does not fire inside "énorme";
+# symbols such as "€" have no word boundary and match anywhere
+FOLLOW_UP_TERM_RE = re.compile(
+    r"(?<!\w)(" + "|".join(re.escape(term) for term in FOLLOW_UP_BY_TERM if term.isalpha()) + r")s?(?!\w)"
+    r"|(" + "|".join(re.escape(term) for term in FOLLOW_UP_BY_TERM if not term.isalpha()) + ")",
+    re.IGNORECASE
+)
+
+# Generic questions completing the suggestions when few topics are recognized
+GENERIC_FOLLOW_UPS = [
+    "Peux-tu détailler ce point?",
+    "Que disent les autres documents à ce sujet?",
+    "Y a-t-il des exigences particulières à respecter?"
+]
+
+# Enhanced system prompt with contradiction detection
+_SYSTEM_PROMPT = (
+    "Tu es un assistant IA spécialisé dans l'analyse de documents BTP (Bâtiment et Travaux Publics). "
+    "Tu es poli, amical et professionnel.\n\n"
+    "RÈGLES IMPORTANTES À SUIVRE:\n\n"
+    "1. DÉTECTION DES CONTRADICTIONS:\n"
+    "   - SEULEMENT si tu trouves des informations contradictoires, tu dois le signaler\n"
+    "   - S'il n'y a PAS de contradiction, réponds DIRECTEMENT sans mentionner l'absence de contradiction\n"
+    "   - Format pour les contradictions: 'J'ai trouvé des informations contradictoires concernant [sujet]:\n"
+    "     • Dans [Document X, Page Y]: [information 1]\n"
+    "     • Dans [Document Z, Page W]: [information 2]'\n\n"
+    "2. RÉPONSES NORMALES (sans contradiction):\n"
+    "   - Donne l'information directement avec la source\n"
+    "   - Exemple: 'Le montant du marché est de 13 490 000 € HT (Document 3, Page 71).'\n"
+    "   - NE DIS PAS: 'je n'ai pas trouvé d'autres informations qui contredisent'\n"
+    "   - NE DIS PAS: 'Cependant, je n'ai pas trouvé...'\n\n"
+    "3. ANALYSE DES RÉPONSES:\n"
+    "   - Vérifie s'il y a des incohérences SEULEMENT si plusieurs sources parlent du même sujet\n"
+    "   - Une seule source = pas de mention de contradiction\n"
+    "   - Plusieurs sources concordantes = cite-les toutes simplement\n"
+    "   - Plusieurs sources contradictoires = signale la contradiction\n\n"
+    "4. TYPES DE QUESTIONS:\n"
+    "   - Salutations: Réponds amicalement\n"
+    "   - Questions factuelles: Utilise UNIQUEMENT les documents\n"
+    "   - Si aucune info trouvée: 'Je n'ai pas trouvé cette information dans les documents fournis.'\n"
+    "   - Questions hors BTP: Redirige poliment vers le domaine BTP\n\n"
+    "5. STYLE DE RÉPONSE:\n"
+    "   - Sois concis et direct\n"
+    "   - Cite tes sources entre parenthèses\n"
+    "   - N'ajoute pas de phrases inutiles sur ce que tu n'as pas trouvé"
+)
+
+# Closing instructions for every answer
+_INSTRUCTION_FOOTER = (
+    "\nInstructions pour répondre:\n"
+    "1. Vérifie s'il y a des informations contradictoires SEULEMENT si tu as plusieurs sources sur le même sujet\n"
+    "2. Si une seule source ou pas de contradiction: réponds directement avec l'information et la source\n"
+    "3. Si contradiction détectée: commence par signaler la contradiction\n"
+    "4. Exemples de bonnes réponses:\n"
+    "   - Sans contradiction: 'Le montant du marché est de 13 490 000 € HT (Document 3, Page 71).'\n"
+    "   - Avec contradiction: 'J'ai trouvé des informations contradictoires...'\n"
+    "5. NE JAMAIS dire 'je n'ai pas trouvé de contradiction' ou 'aucune autre information ne contredit'"
+)
+
+# Single static system message: rules first, then the answer instructions
+_CACHED_SYSTEM_PROMPT = _SYSTEM_PROMPT + "\n" + _INSTRUCTION_FOOTER  # Footer starts with its own newline
+
+
 class ConversationalRAGEngine:
-    def __init__(self, api_key: str = None, model: str = None):
+    def __init__(self, api_key: str = None, model: str = None, classifier_model: str = None,
+                 use_llm_followups: bool = False):
         self.api_key = api_key or config.OPENAI_API_KEY
         self.model = model or config.CHAT_MODEL
-        self.client = OpenAI(api_key=self.api_key)
+        self.classifier_model = classifier_model or config.CLASSIFIER_MODEL
+        self.client = get_openai_client(self.api_key)
+        # Follow-up suggestions come from templates unless an extra LLM call is enabled
+        self.use_llm_followups = use_llm_followups
+        # Classification results keyed on (query, end of the previous answer)
+        self._cached_search_classification = lru_cache(maxsize=512)(self._classify_need_search)
     
-    def generate_conversational_response(self, 
-                                       query: str, 
-                                       search_results: List[Dict],
-                                       conversation_history: str = "",
-                                       include_sources: bool = True) -> Dict:
-        """Generate a conversational response using RAG with conversation context."""
+    def _build_prompts(self,
+                       query: str,
+                       search_results: List[Dict],
+                       conversation_history: str = "") -> Tuple[str, str]:
+        """Build the system and user prompts for a conversational response."""
         
         # Prepare context from search results
-        document_context = ""
-        if search_results:
-            for i, item in enumerate(search_results):
-                document_context += (
-                    f"[Document {i+1}] {item['source_document']} "
-                    f"(Page {item['page_number']}, Paragraphe {item['paragraph_number']}): "
-                    f"{item['text']}\n\n"
-                )
-        
-        # Enhanced system prompt with contradiction detection
-        prompt_system = (
-            "Tu es un assistant IA spécialisé dans l'analyse de documents BTP (Bâtiment et Travaux Publics). "
-            "Tu es poli, amical et professionnel.\n\n"
-            "RÈGLES IMPORTANTES À SUIVRE:\n\n"
-            "1. DÉTECTION DES CONTRADICTIONS:\n"
-            "   - SEULEMENT si tu trouves des informations contradictoires, tu dois le signaler\n"
-            "   - S'il n'y a PAS de contradiction, réponds DIRECTEMENT sans mentionner l'absence de contradiction\n"
-            "   - Format pour les contradictions: 'J'ai trouvé des informations contradictoires concernant [sujet]:\n"
-            "     • Dans [Document X, Page Y]: [information 1]\n"
-            "     • Dans [Document Z, Page W]: [information 2]'\n\n"
-            "2. RÉPONSES NORMALES (sans contradiction):\n"
-            "   - Donne l'information directement avec la source\n"
-            "   - Exemple: 'Le montant du marché est de 13 490 000 € HT (Document 3, Page 71).'\n"
-            "   - NE DIS PAS: 'je n'ai pas trouvé d'autres informations qui contredisent'\n"
-            "   - NE DIS PAS: 'Cependant, je n'ai pas trouvé...'\n\n"
-            "3. ANALYSE DES RÉPONSES:\n"
-            "   - Vérifie s'il y a des incohérences SEULEMENT si plusieurs sources parlent du même sujet\n"
-            "   - Une seule source = pas de mention de contradiction\n"
-            "   - Plusieurs sources concordantes = cite-les toutes simplement\n"
-            "   - Plusieurs sources contradictoires = signale la contradiction\n\n"
-            "4. TYPES DE QUESTIONS:\n"
-            "   - Salutations: Réponds amicalement\n"
-            "   - Questions factuelles: Utilise UNIQUEMENT les documents\n"
-            "   - Si aucune info trouvée: 'Je n'ai pas trouvé cette information dans les documents fournis.'\n"
-            "   - Questions hors BTP: Redirige poliment vers le domaine BTP\n\n"
-            "5. STYLE DE RÉPONSE:\n"
-            "   - Sois concis et direct\n"
-            "   - Cite tes sources entre parenthèses\n"
-            "   - N'ajoute pas de phrases inutiles sur ce que tu n'as pas trouvé"
+        document_context = "".join(
+            f"[Document {i+1}] {item['source_document']} "
+            f"(Page {item['page_number']}, Paragraphe {item['paragraph_number']}): "
+            f"{item['text']}\n\n"
+            for i, item in enumerate(search_results or [])
         )
         
+        # Static instructions all go in the system message, so every request shares the same
+        # prompt prefix and OpenAI's automatic prompt caching can reuse it
+        prompt_system = _CACHED_SYSTEM_PROMPT
+        
         # Construct the user prompt
         prompt_parts = []
         
@@ -72,18 +190,28 @@ class ConversationalRAGEngine:
         
         prompt_parts.append(f"Question de l'utilisateur: {query}")
         
-        prompt_parts.append(
-            "\nInstructions pour répondre:\n"
-            "1. Vérifie s'il y a des informations contradictoires SEULEMENT si tu as plusieurs sources sur le même sujet\n"
-            "2. Si une seule source ou pas de contradiction: réponds directement avec l'information et la source\n"
-            "3. Si contradiction détectée: commence par signaler la contradiction\n"
-            "4. Exemples de bonnes réponses:\n"
-            "   - Sans contradiction: 'Le montant du marché est de 13 490 000 € HT (Document 3, Page 71).'\n"
-            "   - Avec contradiction: 'J'ai trouvé des informations contradictoires...'\n"
-            "5. NE JAMAIS dire 'je n'ai pas trouvé de contradiction' ou 'aucune autre information ne contredit'"
-        )
+        return prompt_system, "\n\n".join(prompt_parts)
+    
+    def generate_conversational_response(self, 
+                                       query: str, 
+                                       search_results: List[Dict],
+                                       conversation_history: str = "",
+                                       include_sources: bool = True,
+                                       executor: Optional[Executor] = None) -> Dict:
+        """Generate a conversational response using RAG with conversation context."""
+        cached_response = self.get_cached_response(query, search_results, conversation_history, include_sources)
+        if cached_response is not None:
+            return cached_response
         
-        prompt_user = "\n\n".join(prompt_parts)
+        prompt_system, prompt_user = self._build_prompts(query, search_results, conversation_history)
+        
+        # LLM suggestions only need the retrieved passages, so with a caller-provided executor
+        # they are requested during the answer call; otherwise finalize_response builds them
+        suggestions_future = None
+        if executor is not None and search_results and self.use_llm_followups:
+            suggestions_future = executor.submit(
+                self.suggest_follow_ups_from_context, query, search_results
+            )
         
         # Generate response
         response = self.client.chat.completions.create(
@@ -93,14 +221,119 @@ class ConversationalRAGEngine:
                 {"role": "user", "content": prompt_user}
             ],
             temperature=0.1,  # Low temperature for accurate fact reporting
-            max_tokens=1000
+            max_tokens=self._max_tokens_for(query)
+        )
+        
+        response_data = self.finalize_response(
+            query, response.choices[0].message.content, search_results, include_sources,
+            suggestions_future=suggestions_future
+        )
+        self.cache_response(query, search_results, conversation_history, include_sources, response_data)
+        return response_data
+    
+    def _response_cache_key(self, query: str, search_results: List[Dict], conversation_history: str) -> bytes:
+        """Fingerprint the normalized question, the retrieved passages in rank order, the history and the model."""
+        # Passage text is part of the key, so a revised document re-uploaded under the
+        # same file name never serves answers built from its old content
+        passages = [
+            (item['source_document'], item['page_number'], item['paragraph_number'], item['text'])
+            for item in search_results
+        ]
+        # Roles and contents of the history shape the answer; the display times do not
+        history = HISTORY_TIMESTAMP_RE.sub("", conversation_history)
+        payload = json.dumps([query.strip().casefold(), passages, history, self.model], ensure_ascii=False)
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).digest()
+    
+    def get_cached_response(self,
+                            query: str,
+                            search_results: List[Dict],
+                            conversation_history: str = "",
+                            include_sources: bool = True) -> Optional[Dict]:
+        """Get the finalized response to the same question over the same passages and history if available and not expired."""
+        # Only answers grounded in a fresh search are cached
+        if not include_sources or not search_results:
+            return None
+        
+        cache_key = self._response_cache_key(query, search_results, conversation_history)
+        with _RESPONSE_CACHE_LOCK:
+            cached_data = _RESPONSE_CACHE.get(cache_key)
+            if cached_data is None:
+                return None
+            
+            expiry, response_data = cached_data
+            if expiry <= time.monotonic():
+                del _RESPONSE_CACHE[cache_key]
+                return None
+            
+            # Mark as most recently used
+            _RESPONSE_CACHE.move_to_end(cache_key)
+            return response_data
+    
+    def cache_response(self,
+                       query: str,
+                       search_results: List[Dict],
+                       conversation_history: str,
+                       include_sources: bool,
+                       response_data: Dict):
+        """Cache a finalized response, evicting the least recently used entries."""
+        if not include_sources or not search_results:
+            return
+        
+        cache_key = self._response_cache_key(query, search_results, conversation_history)
+        with _RESPONSE_CACHE_LOCK:
+            _RESPONSE_CACHE[cache_key] = (time.monotonic() + RESPONSE_CACHE_TTL_SECONDS, response_data)
+            _RESPONSE_CACHE.move_to_end(cache_key)
+            
+            # Limit cache size
+            while len(_RESPONSE_CACHE) > RESPONSE_CACHE_SIZE:
+                _RESPONSE_CACHE.popitem(last=False)
+    
+    def generate_conversational_response_stream(self,
+                                              query: str,
+                                              search_results: List[Dict],
+                                              conversation_history: str = "") -> Iterator[str]:
+        """Stream the response text as it is generated; pass the full text to finalize_response."""
+        prompt_system, prompt_user = self._build_prompts(query, search_results, conversation_history)
+        
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": prompt_system},
+                {"role": "user", "content": prompt_user}
+            ],
+            temperature=0.1,  # Low temperature for accurate fact reporting
+            max_tokens=self._max_tokens_for(query),
+            stream=True
         )
         
-        ai_response = response.choices[0].message.content
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
+    @staticmethod
+    def _max_tokens_for(query: str) -> int:
+        """Pick the answer length cap from the intent of the query."""
+        query_lower = query.lower().strip()
+        for intent, pattern in SOCIAL_INTENT_RE.items():
+            if pattern.fullmatch(query_lower):
+                return MAX_TOKENS_BY_INTENT[intent]
+        return MAX_TOKENS_BY_INTENT['search']
+    
+    @staticmethod
+    def mentions_contradiction(text: str) -> bool:
+        """Check whether a response reports contradictory information."""
+        return bool(CONTRADICTION_RE.search(text))
+    
+    def finalize_response(self,
+                          query: str,
+                          ai_response: str,
+                          search_results: List[Dict],
+                          include_sources: bool = True,
+                          suggestions_future: Optional[Future] = None) -> Dict:
+        """Add contradiction flag, follow-up suggestions and sources to a generated response."""
         
         # Check if contradictions were found (for UI enhancement)
-        has_contradictions = any(word in ai_response.lower() for word in 
-                               ['contradiction', 'contradictoire', 'incohérent', 'différent'])
+        has_contradictions = self.mentions_contradiction(ai_response)
         
         # Generate follow-up suggestions
         follow_up_suggestions = []
@@ -112,22 +345,31 @@ class ConversationalRAGEngine:
                     "Y a-t-il d'autres documents qui pourraient clarifier?",
                     "Ces différences sont-elles significatives pour le projet?"
                 ]
-            else:
+            elif suggestions_future is not None:
+                # Suggestions prefetched while the answer was generated
+                follow_up_suggestions = suggestions_future.result()
+            elif self.use_llm_followups:
                 follow_up_suggestions = self._generate_follow_up_suggestions(query, ai_response)
+            else:
+                follow_up_suggestions = self._template_follow_up_suggestions(ai_response, search_results)
         
-        # Format sources if needed
+        # Format sources if needed. Search results arrive from near_vector in ascending
+        # distance order, so no sort is needed; the closest hit per paragraph is kept.
         sources = []
         if include_sources and search_results:
+            sources_by_paragraph = {}
             for item in search_results:
-                source = {
-                    "type": "text",
-                    "distance": item.get('distance', 0),
-                    "document": item['source_document'],
-                    "page": item['page_number'],
-                    "paragraph": item['paragraph_number']
-                }
-                sources.append(source)
-            sources.sort(key=lambda x: x['distance'])
+                key = (item['source_document'], item['page_number'], item['paragraph_number'])
+                if key not in sources_by_paragraph:
+                    sources_by_paragraph[key] = {
+                        "type": "text",
+                        "distance": item.get('distance', 0),
+                        "document": item['source_document'],
+                        "document_basename": item.get('document_basename') or os.path.basename(item['source_document']),
+                        "page": item['page_number'],
+                        "paragraph": item['paragraph_number']
+                    }
+            sources = list(sources_by_paragraph.values())
         
         return {
             "response": ai_response,
@@ -137,10 +379,33 @@ class ConversationalRAGEngine:
         }
     
     
-    def _generate_follow_up_suggestions(self, query: str, response: str) -> List[str]:
+    @staticmethod
+    def _template_follow_up_suggestions(response: str, search_results: List[Dict]) -> List[str]:
+        """Build three follow-up questions from the topics in the response, without an LLM call."""
+        suggestions = []
+        for match in FOLLOW_UP_TERM_RE.finditer(response):
+            question = FOLLOW_UP_BY_TERM[(match.group(1) or match.group(2)).lower()]
+            if question not in suggestions:
+                suggestions.append(question)
+                if len(suggestions) == 3:
+                    return suggestions
+        
+        # Point to the best-matching document, then fall back to generic questions
+        top_result = search_results[0]
+        top_document = top_result.get('document_basename') or os.path.basename(top_result['source_document'])
+        candidates = [f"Que dit le document {top_document} sur d'autres aspects?", *GENERIC_FOLLOW_UPS]
+        suggestions.extend(candidates[:3 - len(suggestions)])
+        return suggestions
+    
+    def suggest_follow_ups_from_context(self, query: str, search_results: List[Dict]) -> List[str]:
+        """Generate follow-up suggestions from the retrieved passages, without waiting for the answer."""
+        excerpts = " ".join(item.get('text_preview', item['text']) for item in search_results[:3])
+        return self._generate_follow_up_suggestions(query, excerpts, label="ces extraits de documents")
+    
+    def _generate_follow_up_suggestions(self, query: str, response: str, label: str = "cette réponse") -> List[str]:
         """Generate contextual follow-up question suggestions."""
         prompt = (
-            f"Basé sur cette question: '{query}' et cette réponse: '{response}', "
+            f"Basé sur cette question: '{query}' et {label}: '{response}', "
             "suggère 3 questions de suivi courtes et pertinentes que l'utilisateur pourrait poser. "
             "Les questions doivent être en français, naturelles et directement liées au contexte BTP. "
             "Format: une question par ligne, sans numérotation."
@@ -166,6 +431,31 @@ class ConversationalRAGEngine:
             # Return empty list if generation fails
             return []
     
+    def needs_document_search(self, query: str, last_answer: str = "") -> bool:
+        """Ask the classifier model whether a query needs a new document search."""
+        return self._cached_search_classification(query.strip().lower(), last_answer[-300:])
+    
+    def _classify_need_search(self, query: str, last_answer: str) -> bool:
+        """Single-token yes/no classification of the need for a new search."""
+        response = self.client.chat.completions.create(
+            model=self.classifier_model,
+            messages=[
+                {"role": "system", "content": (
+                    "Tu décides si la question d'un utilisateur nécessite une nouvelle recherche "
+                    "dans des documents BTP, ou si la réponse précédente suffit. "
+                    "Réponds uniquement par 'oui' ou 'non'."
+                )},
+                {"role": "user", "content": (
+                    f"Réponse précédente: {last_answer or 'Aucune'}\n"
+                    f"Question: {query}"
+                )}
+            ],
+            temperature=0,
+            max_tokens=1
+        )
+        
+        return response.choices[0].message.content.strip().lower().startswith("o")
+    
     def analyze_intent(self, query: str, conversation_history: str = "") -> Dict:
         """Analyze user intent to determine the type of response needed."""
         prompt = (
@@ -188,18 +478,32 @@ class ConversationalRAGEngine:
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0,
-                max_tokens=100
+                max_tokens=60,
+                # Constrains the reply to the intent schema; refusals and truncation still need the fallback
+                response_format=INTENT_RESPONSE_FORMAT
             )
             
-            import json
-            return json.loads(response.choices[0].message.content)
-        except:
-            # Default intent analysis
-            return {
-                "intent": "search",
-                "requires_new_search": True,
-                "confidence": 0.5
-            }
+            message = response.choices[0].message
+            # A refusal comes back with no content to parse
+            if message.refusal is None and message.content is not None:
+                return json.loads(message.content)
+        except (OpenAIError, ValueError):
+            pass
+        
+        # Default intent analysis
+        return {
+            "intent": "search",
+            "requires_new_search": True,
+            "confidence": 0.5
+        }
+    
+    @staticmethod
+    def _summary_line(message: Dict) -> str:
+        """Format a message for summarization, truncating its content to 200 characters."""
+        content = message['content']
+        if len(content) > 200:
+            content = content[:200] + "..."
+        return f"{message['role'].capitalize()}: {content}"
     
     def summarize_conversation(self, messages: List[Dict], max_length: int = 500) -> str:
         """Summarize a conversation to fit within token limits."""
@@ -207,11 +511,7 @@ class ConversationalRAGEngine:
             return ""
         
         # Convert messages to text
-        conversation_text = "\n".join([
-            f"{msg['role'].capitalize()}: {msg['content'][:200]}..." 
-            if len(msg['content']) > 200 else f"{msg['role'].capitalize()}: {msg['content']}"
-            for msg in messages
-        ])
+        conversation_text = "\n".join(self._summary_line(msg) for msg in messages)
         
         if len(conversation_text) <= max_length:
             return conversation_text
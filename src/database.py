@@ -1,12 +1,34 @@
 """Database operations module for Weaviate."""
+import asyncio
 import weaviate
 import weaviate.classes.config as wc
+from weaviate.classes.data import DataObject
 from weaviate.util import generate_uuid5
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional
 from tqdm import tqdm
 import config
 
 
+# Objects sent per batch request and number of batch requests in flight
+BATCH_SIZE = 64
+BATCH_CONCURRENT_REQUESTS = 2
+
+# Number of insert requests in flight with the async client
+ASYNC_INGEST_CONCURRENCY = 4
+
+# Candidates fetched from the quantized index and rescored with full-precision vectors
+RESCORE_LIMIT = 100
+
+# Objects indexed before the int8 scalar quantizer is trained (server default is 100k,
+# which a document-sized corpus never reaches)
+SQ_TRAINING_LIMIT = 10000
+
+# HNSW search list size scales with the query limit: ef = clamp(limit * factor, min, max)
+DYNAMIC_EF_MIN = 64
+DYNAMIC_EF_MAX = 500
+DYNAMIC_EF_FACTOR = 4
+
+
 class WeaviateDatabase:
     def __init__(self, url: str = None, api_key: str = None, openai_api_key: str = None):
         self.url = url or config.WEAVIATE_URL
@@ -25,8 +47,56 @@ class WeaviateDatabase:
         }
     )
     
-    def create_collection(self, collection_name: str):
-        """Create a new collection in Weaviate."""
+    def _quantizer_config(self, quantization: str):
+        """Build the quantizer for stored vectors: int8 ("sq"), 1-bit ("bq") or none."""
+        if quantization == "sq":
+            return wc.Configure.VectorIndex.Quantizer.sq(
+                rescore_limit=RESCORE_LIMIT,
+                training_limit=SQ_TRAINING_LIMIT
+            )
+        if quantization == "bq":
+            return wc.Configure.VectorIndex.Quantizer.bq(cache=True, rescore_limit=RESCORE_LIMIT)
+        if quantization == "none":
+            return None
+        raise ValueError(f"Unknown quantization: {quantization}")
+    
+    def _vector_index_config(self, index_type: str, quantization: Optional[str] = None):
+        """Build the vector index configuration for a new collection."""
+        if index_type == "hnsw":
+            # Two-stage retrieval: walk the HNSW graph on compressed vectors,
+            # then rescore the top candidates with the original vectors
+            return wc.Configure.VectorIndex.hnsw(
+                ef=-1,  # Dynamic ef, derived from each query's limit
+                dynamic_ef_min=DYNAMIC_EF_MIN,
+                dynamic_ef_max=DYNAMIC_EF_MAX,
+                dynamic_ef_factor=DYNAMIC_EF_FACTOR,
+                quantizer=self._quantizer_config(quantization or "sq")
+            )
+        
+        # The flat index only supports binary quantization
+        if quantization not in (None, "bq", "none"):
+            raise ValueError(f"Quantization '{quantization}' is not supported by the flat index")
+        
+        # Scan all 1-bit compressed vectors held in memory, then rescore the
+        # top candidates with the original vectors; no graph to build on ingest
+        return wc.Configure.VectorIndex.flat(
+            quantizer=self._quantizer_config(quantization or "bq")
+        )
+    
+    def create_collection(self,
+                          collection_name: str,
+                          index_type: Optional[str] = None,
+                          quantization: Optional[str] = None):
+        """Create a new collection in Weaviate.
+        
+        quantization is "sq" (int8), "bq" (1-bit) or "none"; defaults to config.VECTOR_QUANTIZATION,
+        then to the index's default (sq for hnsw, bq for flat).
+        """
+        vector_index_config = self._vector_index_config(
+            index_type or config.VECTOR_INDEX_TYPE,
+            quantization or config.VECTOR_QUANTIZATION
+        )
+        
         properties = [
             wc.Property(name="source_document", data_type=wc.DataType.TEXT, skip_vectorization=True),
             wc.Property(name="page_number", data_type=wc.DataType.INT, skip_vectorization=True),
@@ -38,7 +108,8 @@ class WeaviateDatabase:
             self.client.collections.create(
                 name=collection_name,
                 properties=properties,
-                vectorizer_config=None
+                vectorizer_config=None,
+                vector_index_config=vector_index_config
             )
             return True
         except Exception as e:
@@ -47,11 +118,22 @@ class WeaviateDatabase:
     
     def ingest_text_data(self, collection_name: str, text_data: List[Dict], embedding_generator):
         """Ingest text data into Weaviate collection."""
+        # Embed all segments in batched requests rather than one request per segment
+        with tqdm(total=len(text_data), desc="Embedding text data") as progress:
+            vectors = embedding_generator.get_embeddings(
+                [text['text'] for text in text_data],
+                progress_callback=lambda done, total: progress.update(done - progress.n)
+            )
+        
+        return self.ingest_embedded_data(collection_name, text_data, vectors)
+    
+    def ingest_embedded_data(self, collection_name: str, text_data: List[Dict], vectors: List[List[float]]):
+        """Ingest text data with precomputed embeddings into Weaviate collection."""
         collection = self.client.collections.get(collection_name)
         
-        with collection.batch.dynamic() as batch:
-            for text in tqdm(text_data, desc="Ingesting text data"):
-                vector = embedding_generator.get_embedding(text['text'])
+        with collection.batch.fixed_size(batch_size=BATCH_SIZE,
+                                         concurrent_requests=BATCH_CONCURRENT_REQUESTS) as batch:
+            for text, vector in zip(text_data, vectors):
                 text_obj = {
                     "source_document": text['source_document'],
                     "page_number": text['page_number'],
@@ -71,11 +153,61 @@ class WeaviateDatabase:
             print("All objects imported successfully")
             return True
     
+    async def ingest_embedded_data_async(self,
+                                         collection_name: str,
+                                         text_data: List[Dict],
+                                         vectors: List[List[float]],
+                                         progress_callback: Optional[Callable[[int, int], None]] = None):
+        """Ingest pre-embedded text data with the async client, keeping several batches in flight."""
+        objects = [
+            DataObject(
+                properties={
+                    "source_document": text['source_document'],
+                    "page_number": text['page_number'],
+                    "paragraph_number": text['paragraph_number'],
+                    "text": text['text'],
+                },
+                uuid=generate_uuid5(f"{text['source_document']}_{text['page_number']}_{text['paragraph_number']}"),
+                vector=vector
+            )
+            for text, vector in zip(text_data, vectors)
+        ]
+        batches = [objects[i:i + BATCH_SIZE] for i in range(0, len(objects), BATCH_SIZE)]
+        semaphore = asyncio.Semaphore(ASYNC_INGEST_CONCURRENCY)
+        
+        async with weaviate.use_async_with_weaviate_cloud(
+            cluster_url=self.url,
+            auth_credentials=weaviate.auth.AuthApiKey(self.api_key),
+            headers={
+                "X-OpenAI-Api-Key": self.openai_api_key
+            }
+        ) as client:
+            collection = client.collections.get(collection_name)
+            
+            async def upload(batch):
+                async with semaphore:
+                    return len(batch), await collection.data.insert_many(batch)
+            
+            imported = 0
+            failed = 0
+            for upload_task in asyncio.as_completed([upload(batch) for batch in batches]):
+                batch_size, result = await upload_task
+                imported += batch_size
+                failed += len(result.errors)
+                if progress_callback:
+                    progress_callback(imported, len(objects))
+        
+        if failed > 0:
+            print(f"Failed to import {failed} objects")
+            return False
+        else:
+            print("All objects imported successfully")
+            return True
+    
     def collection_exists(self, collection_name: str) -> bool:
         """Check if a collection exists."""
         try:
-            self.client.collections.get(collection_name)
-            return True
+            return self.client.collections.exists(collection_name)
         except:
             return False
     
@@ -83,10 +215,8 @@ class WeaviateDatabase:
         """Get statistics about a collection."""
         try:
             collection = self.client.collections.get(collection_name)
-            # Count objects in collection
-            count = 0
-            for _ in collection.iterator():
-                count += 1
+            # Count objects server-side instead of paging through every object
+            count = collection.aggregate.over_all(total_count=True).total_count
             return {"exists": True, "object_count": count}
         except:
             return {"exists": False, "object_count": 0}
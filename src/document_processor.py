@@ -45,4 +45,13 @@ class DocumentProcessor:
                     "text": text_content
                 })
         
-        return text_data
\ No newline at end of file
+        return text_data
+
+
+def extract_pdf(document_path: str, images_output_dir: str) -> List[Dict]:
+    """Process a PDF and extract its text segments.
+    
+    Module-level so it can be pickled and run in a worker process.
+    """
+    processor = DocumentProcessor(images_output_dir=images_output_dir)
+    return processor.extract_text_with_metadata(processor.process_pdf(document_path), document_path)
@@ -1,14 +1,28 @@
 """Embeddings generation module."""
-from openai import OpenAI
-from typing import List
+import threading
+from collections import OrderedDict
+from .openai_client import get_openai_client
+from typing import Callable, List, Optional
 import config
 
 
+# Number of query embeddings memoized per generator
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+
+# Texts sent per embeddings request; keeps requests well under the API's per-request
+# token limit and gives the upload progress bar regular updates
+EMBEDDING_BATCH_SIZE = 256
+
+
 class EmbeddingGenerator:
     def __init__(self, api_key: str = None, model: str = None):
         self.api_key = api_key or config.OPENAI_API_KEY
         self.model = model or config.EMBEDDING_MODEL
-        self.client = OpenAI(api_key=self.api_key)
+        self.client = get_openai_client(self.api_key)
+        # Per-instance cache so repeated queries skip the embeddings round trip:
+        # normalized query -> embedding of the query as typed, least recently used first
+        self._query_embeddings = OrderedDict()
+        self._query_embeddings_lock = threading.Lock()
     
     def get_embedding(self, text: str) -> List[float]:
         """Generate embedding for a given text."""
@@ -16,4 +30,42 @@ class EmbeddingGenerator:
             input=text,
             model=self.model
         )
-        return response.data[0].embedding
\ No newline at end of file
+        return response.data[0].embedding
+    
+    def get_query_embedding(self, query: str) -> List[float]:
+        """Generate embedding for a search query, memoized on the normalized query."""
+        query = query.strip()
+        # Case only affects the cache key; the text as typed is embedded, so acronyms
+        # and proper nouns keep their casing in the query vector
+        cache_key = query.lower()
+        with self._query_embeddings_lock:
+            embedding = self._query_embeddings.get(cache_key)
+            if embedding is not None:
+                self._query_embeddings.move_to_end(cache_key)
+                return embedding
+        
+        embedding = self.get_embedding(query)
+        with self._query_embeddings_lock:
+            self._query_embeddings[cache_key] = embedding
+            self._query_embeddings.move_to_end(cache_key)
+            while len(self._query_embeddings) > QUERY_EMBEDDING_CACHE_SIZE:
+                self._query_embeddings.popitem(last=False)
+        return embedding
+    
+    def get_embeddings(self,
+                       texts: List[str],
+                       batch_size: int = EMBEDDING_BATCH_SIZE,
+                       progress_callback: Optional[Callable[[int, int], None]] = None) -> List[List[float]]:
+        """Generate embeddings for many texts, sending one request per batch."""
+        embeddings = []
+        for start in range(0, len(texts), batch_size):
+            response = self.client.embeddings.create(
+                input=texts[start:start + batch_size],
+                model=self.model
+            )
+            embeddings.extend(item.embedding for item in response.data)
+            
+            if progress_callback:
+                progress_callback(len(embeddings), len(texts))
+        
+        return embeddings
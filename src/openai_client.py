@@ -0,0 +1,21 @@
+"""Shared OpenAI client module."""
+from functools import lru_cache
+import httpx
+from openai import DEFAULT_TIMEOUT, DefaultHttpxClient, OpenAI
+
+
+# Connection pool shared by every OpenAI call of the process. Idle connections are kept
+# long enough to survive the pause between two chat turns, so each turn skips the TLS handshake.
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0)
+# Connecting should never take long; reads keep the SDK default, since non-streaming answers
+# and large embedding batches can legitimately take minutes
+HTTP_TIMEOUT = httpx.Timeout(DEFAULT_TIMEOUT.read, connect=10.0)
+
+
+@lru_cache(maxsize=None)
+def get_openai_client(api_key: str) -> OpenAI:
+    """Return the process-wide OpenAI client for an API key, reusing its connection pool."""
+    return OpenAI(
+        api_key=api_key,
+        http_client=DefaultHttpxClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    )
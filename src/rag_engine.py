@@ -1,5 +1,5 @@
 """RAG engine for generating responses."""
-from openai import OpenAI
+from .openai_client import get_openai_client
 from typing import List, Dict
 import config
 
@@ -8,7 +8,7 @@ class RAGEngine:
     def __init__(self, api_key: str = None, model: str = None):
         self.api_key = api_key or config.OPENAI_API_KEY
         self.model = model or config.CHAT_MODEL
-        self.client = OpenAI(api_key=self.api_key)
+        self.client = get_openai_client(self.api_key)
     
     def generate_response(self, query: str, context: str) -> str:
         """Generate response using RAG."""
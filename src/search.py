@@ -1,8 +1,98 @@
 """Enhanced search functionality module with conversational features."""
+import os
 import weaviate.classes.query as wq
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
+import heapq
 import re
 from datetime import datetime
+from functools import lru_cache
+
+
+# Properties read by format_search_results; stored vectors are never returned
+RETURN_PROPERTIES = ["source_document", "page_number", "paragraph_number", "text"]
+
+
+def _compile_alternation(patterns):
+    """Compile a list of regex patterns into a single alternation."""
+    return re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+
+
+# Direct document references and question patterns
+SEARCH_RE = _compile_alternation([
+    r'\b(document|fichier|page|pdf|dossier)\b',
+    r'\b(section|chapitre|partie|paragraphe)\b',
+    r'^(quel|quelle|quels|quelles)\b',
+    r'^(où|ou)\b.*\?',
+    r'^(comment|combien|pourquoi|quand|qui|quoi)\b',
+    r'\b(trouve|recherche|cherche|localise)\b',
+    r'\b(montre|affiche|présente|donne)\b.*\b(moi|nous)\b'
+])
+
+# No-search patterns
+NO_SEARCH_RE = _compile_alternation([
+    r'^(merci|ok|d\'accord|compris|parfait)',
+    r'^(bonjour|salut|bonsoir|hello|hi)\b',
+    r'\b(explique|précise|reformule|clarifie)\b',
+    r'^(oui|non|si|peut-être)\b',
+    r'^\?+$',  # Just question marks
+])
+
+# Pronoun references to the previous answer
+PRONOUN_RE = _compile_alternation([r'^(il|elle|ce|ça|cela|celui)', r'\b(le|la|les)\b'])
+
+
+def should_search_documents(query: str,
+                            recent_context: list,
+                            classifier: Optional[Callable[[str], bool]] = None) -> bool:
+    """Determine if we need to search documents for this query.
+    
+    Obvious cases are settled by the keyword heuristics; ambiguous ones go to the
+    optional classifier, falling back to the query length.
+    """
+    query_lower = query.lower().strip()
+    decision = _should_search(query_lower, bool(recent_context))
+    if decision is not None:
+        return decision
+    
+    if classifier:
+        try:
+            return classifier(query_lower)
+        except Exception as e:
+            print(f"Search classifier failed: {e}")
+    
+    # Default: search for queries > 5 words, don't search for shorter ones
+    return len(query_lower.split()) > 4
+
+
+@lru_cache(maxsize=256)
+def _should_search(query_lower: str, has_context: bool) -> Optional[bool]:
+    """Cached heuristic search decision for a normalized query, None when ambiguous."""
+    
+    # Handle very short queries
+    if len(query_lower) < 3:
+        return False
+    
+    # Check no-search patterns first
+    if NO_SEARCH_RE.search(query_lower):
+        return False
+    
+    # Check search patterns
+    if SEARCH_RE.search(query_lower):
+        return True
+    
+    # Context-aware decision
+    if has_context:
+        # If it's a very short follow-up, likely doesn't need search
+        if len(query_lower.split()) <= 3:
+            # Check if it's a pronoun reference
+            if PRONOUN_RE.search(query_lower):
+                return False
+    
+    # Check if it's a complete question (ends with ?)
+    if query_lower.endswith('?') and len(query_lower.split()) > 3:
+        return True
+    
+    return None
 
 
 class SearchEngine:
@@ -10,20 +100,33 @@ class SearchEngine:
         self.client = weaviate_client
         self.embedding_generator = embedding_generator
         self.search_history = []  # Track recent searches for context
+        self._collections = {}  # Collection handles reused across queries
+    
+    def _get_collection(self, collection_name: str):
+        """Return a cached handle on the collection, bound to the shared client connection."""
+        collection = self._collections.get(collection_name)
+        if collection is None:
+            collection = self.client.collections.get(collection_name)
+            self._collections[collection_name] = collection
+        return collection
     
-    def search_multimodal(self, query: str, collection_name: str, limit: int = 3):
-        """Perform vector search on the collection."""
-        query_vector = self.embedding_generator.get_embedding(query)
+    def search_multimodal(self,
+                          query: str,
+                          collection_name: str,
+                          limit: int = 3,
+                          query_vector: Optional[List[float]] = None):
+        """Perform vector search on the collection, embedding the query unless a vector is given."""
+        if query_vector is None:
+            query_vector = self.embedding_generator.get_query_embedding(query)
         
-        collection = self.client.collections.get(collection_name)
+        collection = self._get_collection(collection_name)
         
         response = collection.query.near_vector(
             near_vector=query_vector,
             limit=limit,
             return_metadata=wq.MetadataQuery(distance=True),
-            return_properties=[
-                "source_document", "page_number", "paragraph_number", "text"
-            ]
+            return_properties=RETURN_PROPERTIES,
+            include_vector=False
         )
         
         # Track search
@@ -91,7 +194,7 @@ class SearchEngine:
                                related_pages: Dict[str, List[int]],
                                limit: int):
         """Search for content from related documents or pages."""
-        collection = self.client.collections.get(collection_name)
+        collection = self._get_collection(collection_name)
         related_results = []
         
         for doc in related_documents:
@@ -103,10 +206,15 @@ class SearchEngine:
                         target_page = page + page_offset
                         if target_page > 0:  # Valid page number
                             try:
-                                results = collection.query.where(
-                                    wq.Filter.by_property("source_document").equal(doc) &
-                                    wq.Filter.by_property("page_number").equal(target_page)
-                                ).with_limit(limit).do()
+                                results = collection.query.fetch_objects(
+                                    filters=(
+                                        wq.Filter.by_property("source_document").equal(doc) &
+                                        wq.Filter.by_property("page_number").equal(target_page)
+                                    ),
+                                    limit=limit,
+                                    return_properties=RETURN_PROPERTIES,
+                                    include_vector=False
+                                )
                                 
                                 related_results.extend(results.objects)
                                 
@@ -121,17 +229,21 @@ class SearchEngine:
         """Format search results for display with enhanced metadata."""
         formatted_results = []
         
-        for i, item in enumerate(search_results):
-            result = {
-                "source_document": item.properties['source_document'],
-                "page_number": item.properties['page_number'],
-                "paragraph_number": item.properties['paragraph_number'],
-                "text": item.properties['text'],
-                "distance": item.metadata.distance if hasattr(item.metadata, 'distance') else 0.0,
-                "result_index": i + 1,
-                "text_preview": self._create_text_preview(item.properties['text'], 150)
-            }
-            formatted_results.append(result)
+        for i, item in enumerate(search_results, start=1):
+            properties = item.properties
+            text = properties['text']
+            source_document = properties['source_document']
+            formatted_results.append({
+                "source_document": source_document,
+                # File name computed once per hit, reused by sources and display
+                "document_basename": os.path.basename(source_document),
+                "page_number": properties['page_number'],
+                "paragraph_number": properties['paragraph_number'],
+                "text": text,
+                "distance": getattr(item.metadata, 'distance', 0.0),
+                "result_index": i,
+                "text_preview": self._create_text_preview(text, 150)
+            })
         
         return formatted_results
     
@@ -238,6 +350,6 @@ class SearchEngine:
         
         return {
             "pattern": pattern,
-            "frequent_keywords": sorted(keyword_freq.items(), key=lambda x: x[1], reverse=True)[:3],
+            "frequent_keywords": heapq.nlargest(3, keyword_freq.items(), key=lambda x: x[1]),
             "search_count": len(self.search_history)
         }
\ No newline at end of file